@@ -3,16 +3,37 @@ import json
 import docopt
 import re
 
-CONFIG_JSON = os.path.join(os.path.dirname(__file__), '../../config/config.json')
+# The RECORDSDB_CONFIG environment variable can point to a different config file (e.g., one with "db_url": "sqlite://"
+#   for tests)
+CONFIG_JSON = os.environ.get('RECORDSDB_CONFIG') or os.path.join(os.path.dirname(__file__), '../../config/config.json')
 
-if not os.path.isfile(CONFIG_JSON):
-    raise IOError(
-        f'No config file found at {os.path.abspath(CONFIG_JSON)}. A directory named "config" with a config.json file'
-         ' must exist at the same directory level as the package directory.'
-    )
+_config = None
 
-with open(CONFIG_JSON) as f:
-    config = json.load(f)
+
+def get_config() -> dict:
+    """
+    Read the config file the first time it's needed. Modules that don't use the database or the attachments directory
+    (e.g., file_codes) can then be imported without a config file
+    :return: dictionary of config values
+    """
+    global _config
+    if _config is None:
+        if not os.path.isfile(CONFIG_JSON):
+            raise IOError(
+                f'No config file found at {os.path.abspath(CONFIG_JSON)}. A directory named "config" with a config.json'
+                 ' file must exist at the same directory level as the package directory.'
+            )
+        with open(CONFIG_JSON) as f:
+            _config = json.load(f)
+
+    return _config
+
+
+def __getattr__(name):
+    # recordsdb.config (and "from recordsdb import config") reads the config file on first use
+    if name == 'config':
+        return get_config()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def get_docopt_args(doc):
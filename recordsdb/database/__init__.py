@@ -1,11 +1,59 @@
-from sqlalchemy import create_engine
+import typing
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from recordsdb import config
 
-engine = create_engine(
-    'postgresql://{username}:{password}@{ip_address}:{port}/{db_name}'.format(**config['db_params'])
-)
+
+def get_db_url() -> str:
+    """
+    Get the database URL from the config. A "db_url" entry (e.g., "sqlite://" for an in-memory database) takes
+    precedence over the PostgreSQL connection parameters in "db_params"
+    """
+    if config.get('db_url'):
+        return config['db_url']
+    return 'postgresql://{username}:{password}@{ip_address}:{port}/{db_name}'.format(**config['db_params'])
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record) -> None:
+    # SQLite doesn't enforce foreign keys unless asked to on every connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+def create_db_engine(url: typing.Optional[str]=None, retention_schedule_csv: typing.Optional[str]=None) -> Engine:
+    """
+    Create an engine for the records database. An in-memory SQLite URL ("sqlite://") gives a throwaway database with
+    the full schema built and the lookup tables seeded, which is useful for tests and for validating imports without
+    a database server. All connections from an in-memory engine share the same database.
+    :param url: SQLAlchemy database URL. Defaults to get_db_url()
+    :param retention_schedule_csv: For in-memory databases, the retention schedule .csv to fill nps_file_codes from.
+        Defaults to the "retention_schedule_csv" config entry, if there is one
+    :return: SQLAlchemy Engine
+    """
+    url = make_url(url or get_db_url())
+
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(url)
+
+    is_in_memory = url.database in (None, '', ':memory:')
+    db_engine = create_engine(
+        url,
+        **({'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}} if is_in_memory else {})
+    )
+    event.listen(db_engine, 'connect', _enable_sqlite_foreign_keys)
+
+    if is_in_memory:
+        from recordsdb.database import create_db
+        create_db.seed_database(db_engine, retention_schedule_csv or config.get('retention_schedule_csv'))
+
+    return db_engine
+
+
+engine = create_db_engine()
 
 # Session factory for flask
-SessionMaker = sessionmaker(engine)
\ No newline at end of file
+SessionMaker = sessionmaker(engine)
@@ -0,0 +1,332 @@
+"""
+Page through collections, boxes, folders, and records for a front end. Pages use keyset cursors (the sort key of the
+last row on the previous page) rather than OFFSET, so every page is an index range scan that costs the same no matter
+how deep into a collection it is. Each browse function returns a Page whose next_cursor is passed back in to get the
+following page.
+"""
+
+import json
+import base64
+import typing
+from datetime import date
+import sqlalchemy as sqla
+from sqlalchemy import orm
+
+from recordsdb.database import models
+
+
+__all__ = [
+    'DEFAULT_PAGE_SIZE',
+    'MAX_PAGE_SIZE',
+    'Page',
+    'browse_collections',
+    'browse_boxes',
+    'browse_folders',
+    'browse_records'
+]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class Page(typing.NamedTuple):
+    rows:           typing.List[dict]
+    # None if this is the last page
+    next_cursor:    typing.Optional[str]
+
+
+def _encode_cursor(key_values: typing.Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key_values)).encode()).decode()
+
+
+def _decode_cursor(cursor: str, n_keys: int) -> list:
+    try:
+        key_values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if not isinstance(key_values, list) or len(key_values) != n_keys:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+    return key_values
+
+
+def _get_page(
+        session: orm.Session,
+        statement: sqla.Select,
+        key_columns: typing.Sequence[sqla.ColumnElement],
+        cursor: typing.Optional[str],
+        page_size: int
+) -> Page:
+    """
+    Apply keyset pagination to a select statement and run it
+    :param session: SQLAlchemy Session
+    :param statement: select statement with any filters applied
+    :param key_columns: columns that uniquely and stably order the rows. Their values must also be selected with the
+        same names so the cursor can be read from the last row
+    :param cursor: next_cursor from the previous page or None for the first page
+    :param page_size: maximum number of rows to return
+    :return: Page
+    """
+    if not 0 < page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f'page_size must be between 1 and {MAX_PAGE_SIZE}')
+
+    if cursor:
+        statement = statement.where(
+            sqla.tuple_(*key_columns) > sqla.tuple_(*_decode_cursor(cursor, len(key_columns)))
+        )
+    # Get one extra row to know whether there's another page without a separate COUNT query
+    statement = statement.order_by(*key_columns).limit(page_size + 1)
+    rows = [dict(row) for row in session.execute(statement).mappings()]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = _encode_cursor([rows[-1][c.key] for c in key_columns])
+
+    return Page(rows, next_cursor)
+
+
+def _filter_date_range(
+        statement: sqla.Select,
+        table: typing.Union[typing.Type[models.Collection], typing.Type[models.Record]],
+        start_date: typing.Optional[date],
+        end_date: typing.Optional[date]
+) -> sqla.Select:
+    """Only include rows whose start/end dates overlap the given range"""
+    if start_date:
+        statement = statement.where(table.end_date >= start_date)
+    if end_date:
+        statement = statement.where(table.start_date <= end_date)
+
+    return statement
+
+
+def _filter_collections(
+        statement: sqla.Select,
+        nps_file_code: typing.Optional[int],
+        program_area_code: typing.Optional[int]
+) -> sqla.Select:
+    if nps_file_code is not None:
+        statement = statement.where(models.Collection.nps_file_code == nps_file_code)
+    if program_area_code is not None:
+        statement = statement.where(models.Collection.program_area_code == program_area_code)
+
+    return statement
+
+
+def browse_collections(
+        session: orm.Session,
+        nps_file_code: typing.Optional[int]=None,
+        program_area_code: typing.Optional[int]=None,
+        start_date: typing.Optional[date]=None,
+        end_date: typing.Optional[date]=None,
+        cursor: typing.Optional[str]=None,
+        page_size: int=DEFAULT_PAGE_SIZE
+) -> Page:
+    """
+    Get a page of collections ordered by id
+    :param session: SQLAlchemy Session
+    :param nps_file_code: only include collections with this file code
+    :param program_area_code: only include collections in this program area
+    :param start_date: only include collections with records from on or after this date
+    :param end_date: only include collections with records from on or before this date
+    :param cursor: next_cursor from the previous page or None for the first page
+    :param page_size: maximum number of collections to return
+    :return: Page of collection dictionaries
+    """
+    statement = sqla.select(
+        models.Collection.id,
+        models.Collection.collection_name,
+        models.Collection.nps_file_code,
+        models.Collection.program_area_code,
+        models.Collection.start_date,
+        models.Collection.end_date,
+        models.Collection.volume_cu_ft,
+        models.Collection.arcis_transfer_number
+    )
+    statement = _filter_collections(statement, nps_file_code, program_area_code)
+    statement = _filter_date_range(statement, models.Collection, start_date, end_date)
+
+    return _get_page(session, statement, [models.Collection.id], cursor, page_size)
+
+
+def _filter_boxes(
+        statement: sqla.Select,
+        table: typing.Union[
+            typing.Type[models.RecordTransferBox],
+            typing.Type[models.RecordTransferFolder],
+            typing.Type[models.Record]
+        ],
+        collection_id: typing.Optional[int],
+        min_box_number: typing.Optional[int],
+        max_box_number: typing.Optional[int],
+        nps_file_code: typing.Optional[int],
+        program_area_code: typing.Optional[int]
+) -> sqla.Select:
+    """Filter boxes, folders, or records on the collection_id and box_number columns of their own table"""
+    if collection_id is not None:
+        statement = statement.where(table.collection_id == collection_id)
+    if min_box_number is not None:
+        statement = statement.where(table.box_number >= min_box_number)
+    if max_box_number is not None:
+        statement = statement.where(table.box_number <= max_box_number)
+    if nps_file_code is not None or program_area_code is not None:
+        statement = statement.join(models.Collection, models.Collection.id == table.collection_id)
+        statement = _filter_collections(statement, nps_file_code, program_area_code)
+
+    return statement
+
+
+def browse_boxes(
+        session: orm.Session,
+        collection_id: typing.Optional[int]=None,
+        min_box_number: typing.Optional[int]=None,
+        max_box_number: typing.Optional[int]=None,
+        nps_file_code: typing.Optional[int]=None,
+        program_area_code: typing.Optional[int]=None,
+        cursor: typing.Optional[str]=None,
+        page_size: int=DEFAULT_PAGE_SIZE
+) -> Page:
+    """
+    Get a page of record transfer boxes ordered by collection, box number, and id
+    :param session: SQLAlchemy Session
+    :param collection_id: only include boxes from this collection
+    :param min_box_number: only include boxes numbered this or higher
+    :param max_box_number: only include boxes numbered this or lower
+    :param nps_file_code: only include boxes from collections with this file code
+    :param program_area_code: only include boxes from collections in this program area
+    :param cursor: next_cursor from the previous page or None for the first page
+    :param page_size: maximum number of boxes to return
+    :return: Page of box dictionaries
+    """
+    statement = sqla.select(
+        models.RecordTransferBox.collection_id,
+        models.RecordTransferBox.box_number,
+        models.RecordTransferBox.id
+    )
+    statement = _filter_boxes(
+        statement,
+        models.RecordTransferBox,
+        collection_id,
+        min_box_number,
+        max_box_number,
+        nps_file_code,
+        program_area_code
+    )
+    key_columns = [
+        models.RecordTransferBox.collection_id,
+        models.RecordTransferBox.box_number,
+        models.RecordTransferBox.id
+    ]
+
+    return _get_page(session, statement, key_columns, cursor, page_size)
+
+
+def browse_folders(
+        session: orm.Session,
+        collection_id: typing.Optional[int]=None,
+        min_box_number: typing.Optional[int]=None,
+        max_box_number: typing.Optional[int]=None,
+        nps_file_code: typing.Optional[int]=None,
+        program_area_code: typing.Optional[int]=None,
+        cursor: typing.Optional[str]=None,
+        page_size: int=DEFAULT_PAGE_SIZE
+) -> Page:
+    """
+    Get a page of record transfer folders ordered by collection, box number, folder number, and id. Folders carry
+    copies of their box's collection_id and box_number, so the whole sort key is in one index
+    (ix_record_transfer_folders_collection_box_folder)
+    :param session: SQLAlchemy Session
+    :param collection_id: only include folders from this collection
+    :param min_box_number: only include folders in boxes numbered this or higher
+    :param max_box_number: only include folders in boxes numbered this or lower
+    :param nps_file_code: only include folders from collections with this file code
+    :param program_area_code: only include folders from collections in this program area
+    :param cursor: next_cursor from the previous page or None for the first page
+    :param page_size: maximum number of folders to return
+    :return: Page of folder dictionaries
+    """
+    statement = sqla.select(
+        models.RecordTransferFolder.collection_id,
+        models.RecordTransferFolder.box_number,
+        models.RecordTransferFolder.folder_number,
+        models.RecordTransferFolder.id,
+        models.RecordTransferFolder.box_id
+    )
+    statement = _filter_boxes(
+        statement,
+        models.RecordTransferFolder,
+        collection_id,
+        min_box_number,
+        max_box_number,
+        nps_file_code,
+        program_area_code
+    )
+    key_columns = [
+        models.RecordTransferFolder.collection_id,
+        models.RecordTransferFolder.box_number,
+        models.RecordTransferFolder.folder_number,
+        models.RecordTransferFolder.id
+    ]
+
+    return _get_page(session, statement, key_columns, cursor, page_size)
+
+
+def browse_records(
+        session: orm.Session,
+        collection_id: typing.Optional[int]=None,
+        min_box_number: typing.Optional[int]=None,
+        max_box_number: typing.Optional[int]=None,
+        start_date: typing.Optional[date]=None,
+        end_date: typing.Optional[date]=None,
+        nps_file_code: typing.Optional[int]=None,
+        program_area_code: typing.Optional[int]=None,
+        cursor: typing.Optional[str]=None,
+        page_size: int=DEFAULT_PAGE_SIZE
+) -> Page:
+    """
+    Get a page of current (not destroyed) records ordered by collection, box number, folder number, and id. Records
+    carry copies of their folder's box and folder numbers, so the whole sort key is in one index
+    (ix_records_collection_box_folder)
+    :param session: SQLAlchemy Session
+    :param collection_id: only include records from this collection
+    :param min_box_number: only include records in boxes numbered this or higher
+    :param max_box_number: only include records in boxes numbered this or lower
+    :param start_date: only include records that end on or after this date
+    :param end_date: only include records that start on or before this date
+    :param nps_file_code: only include records from collections with this file code
+    :param program_area_code: only include records from collections in this program area
+    :param cursor: next_cursor from the previous page or None for the first page
+    :param page_size: maximum number of records to return
+    :return: Page of record dictionaries
+    """
+    statement = sqla.select(
+            models.Record.collection_id,
+            models.Record.box_number,
+            models.Record.folder_number,
+            models.Record.id,
+            models.Record.folder_id,
+            models.Record.file_title,
+            models.Record.start_date,
+            models.Record.end_date,
+            models.Record.cutoff_date
+        )\
+        .where(models.Record.destruction_year == 0) # only current holdings, so only records_current is scanned
+    statement = _filter_boxes(
+        statement,
+        models.Record,
+        collection_id,
+        min_box_number,
+        max_box_number,
+        nps_file_code,
+        program_area_code
+    )
+    statement = _filter_date_range(statement, models.Record, start_date, end_date)
+    key_columns = [
+        models.Record.collection_id,
+        models.Record.box_number,
+        models.Record.folder_number,
+        models.Record.id
+    ]
+
+    return _get_page(session, statement, key_columns, cursor, page_size)
@@ -0,0 +1,254 @@
+"""
+In-process cache of query results for reads that are repeated constantly but change rarely (lookup lists, collection
+summaries, tag lists). Results are keyed by the compiled statement and its parameters and evicted by LRU, TTL, and a
+cap on their approximate size. Entries are invalidated by table: whenever a session from SessionMaker commits changes
+to a table, every cached result that read from that table is dropped.
+
+Only changes made through the ORM or with insert()/update()/delete() statements executed by a Session are seen.
+Changes made with raw SQL text or by other processes are only picked up when entries expire, so keep the TTL short
+enough for those to be acceptable.
+
+Example:
+    from recordsdb.database.cache import query_cache
+    with SessionMaker() as session:
+        statement = sqla.select(models.ParkDivisionCode.name, models.ParkDivisionCode.code)
+        divisions = query_cache.execute(session, statement)
+"""
+
+import time
+import pickle
+import typing
+import threading
+from collections import OrderedDict
+import sqlalchemy as sqla
+from sqlalchemy import orm
+
+from recordsdb.database import models, SessionMaker
+
+
+__all__ = [
+    'DEPENDENT_TABLES',
+    'QueryCache',
+    'query_cache'
+]
+
+# Tables whose contents are derived from other tables by triggers (see models.HOLDINGS_SUMMARY_DDL), so changes to
+#   the source table also invalidate results that read from the derived table
+_HOLDINGS_SUMMARY_TABLES = {models.HoldingsSummary.__tablename__, models.HoldingsSummaryDelta.__tablename__}
+DEPENDENT_TABLES = {
+    models.Collection.__tablename__: _HOLDINGS_SUMMARY_TABLES,
+    models.Record.__tablename__: _HOLDINGS_SUMMARY_TABLES,
+    models.DestroyedCollection.__tablename__: _HOLDINGS_SUMMARY_TABLES
+}
+
+
+class _CacheEntry(typing.NamedTuple):
+    rows:       typing.List[dict]
+    tables:     typing.FrozenSet[str]
+    expires:    float
+    size:       int
+
+
+class _TableCollector:
+    """
+    Mixin for a dialect's statement compiler that records the name of every table it renders. Tables are collected
+    from the compiled SQL rather than the statement because the ORM only adds some of them while compiling (e.g., the
+    secondary table and target of select(Collection).join(Collection.tags)). Subqueries are compiled too, so their
+    tables are included.
+    """
+    def __init__(self, *args, **kwargs):
+        self.table_names: typing.Set[str] = set()
+        super().__init__(*args, **kwargs)
+
+    def visit_table(self, table: sqla.Table, **kwargs) -> str:
+        self.table_names.add(table.name)
+        return super().visit_table(table, **kwargs)
+
+
+_compiler_classes: typing.Dict[type, type] = {}
+
+
+def _compile(session: orm.Session, statement: sqla.sql.Executable) -> sqla.sql.compiler.SQLCompiler:
+    """Compile a statement for the session's database, collecting the names of its tables in table_names"""
+    dialect = session.get_bind().dialect
+    base_class = dialect.statement_compiler
+    compiler_class = _compiler_classes.get(base_class)
+    if compiler_class is None:
+        compiler_class = type(f'TableCollecting{base_class.__name__}', (_TableCollector, base_class), {})
+        _compiler_classes[base_class] = compiler_class
+
+    return compiler_class(dialect, statement)
+
+
+def _add_dependent_tables(tables: typing.Iterable[str]) -> typing.Set[str]:
+    """
+    Add tables that can change when the given tables change: tables with foreign keys to them (which can cascade
+    updates and deletes) and tables maintained from them by triggers
+    """
+    tables = set(tables)
+    to_check = list(tables)
+    while to_check:
+        table_name = to_check.pop()
+        dependents = set(DEPENDENT_TABLES.get(table_name, set()))
+        for table in models.BaseModel.metadata.tables.values():
+            if any(fk.column.table.name == table_name for fk in table.foreign_keys):
+                dependents.add(table.name)
+        to_check.extend(dependents - tables)
+        tables |= dependents
+
+    return tables
+
+
+class QueryCache:
+
+    def __init__(self, max_entries: int=1024, max_bytes: int=64 * 1024 ** 2, ttl: float=300):
+        """
+        :param max_entries: maximum number of results to keep
+        :param max_bytes: maximum approximate (pickled) size of all results together
+        :param ttl: seconds before a result expires
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries: typing.OrderedDict[tuple, _CacheEntry] = OrderedDict()
+        self._table_keys: typing.Dict[str, typing.Set[tuple]] = {}
+        self._size = 0
+        # Incremented on every invalidation so a result read while another session committed isn't stored
+        self._generation = 0
+        self._lock = threading.RLock()
+        # Key in Session.info of the tables changed in the current transaction. Each cache needs its own because each
+        #   one takes its pending tables out when the session commits
+        self._pending_tables_key = f'query_cache_pending_tables_{id(self)}'
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+        for table_name in entry.tables:
+            keys = self._table_keys.get(table_name)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._table_keys[table_name]
+
+    def _store(self, key: tuple, rows: typing.List[dict], tables: typing.FrozenSet[str]) -> None:
+        size = len(pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _CacheEntry(rows, tables, time.monotonic() + self.ttl, size)
+        self._size += size
+        for table_name in tables:
+            self._table_keys.setdefault(table_name, set()).add(key)
+
+        # Evict least recently used entries until under both caps
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def execute(self, session: orm.Session, statement: sqla.sql.Executable) -> typing.List[dict]:
+        """
+        Get the result of a select statement from the cache, or run it and cache the result. Results are returned as
+        a list of dictionaries rather than ORM objects so they can be safely shared between sessions, so select
+        columns (e.g., select(models.Tag.tag_text)) rather than entities.
+        :param session: SQLAlchemy Session
+        :param statement: select statement
+        :return: list of row dictionaries. Treat these as read-only because they're shared
+        """
+        compiled = _compile(session, statement)
+        tables = frozenset(compiled.table_names)
+
+        # The session's own uncommitted changes shouldn't be read from the cache or stored in it
+        if tables & session.info.get(self._pending_tables_key, set()):
+            return [dict(row) for row in session.execute(statement).mappings()]
+
+        key = str(compiled), repr(sorted(compiled.params.items()))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry.rows
+            elif entry:
+                self._remove(key)
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        rows = [dict(row) for row in session.execute(statement).mappings()]
+        # Executing the statement might have autoflushed changes to the tables it reads
+        if not tables & session.info.get(self._pending_tables_key, set()):
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, rows, tables)
+
+        return rows
+
+    def invalidate(self, tables: typing.Optional[typing.Iterable[str]]=None) -> None:
+        """
+        Drop cached results that read from any of the given tables
+        :param tables: table names. If None, the whole cache is cleared
+        """
+        with self._lock:
+            if tables is None:
+                keys = list(self._entries)
+            else:
+                keys = set()
+                for table_name in _add_dependent_tables(tables):
+                    keys |= self._table_keys.get(table_name, set())
+            for key in keys:
+                self._remove(key)
+            self._generation += 1
+            self._stats['invalidations'] += len(keys)
+
+    def stats(self) -> dict:
+        """
+        :return: dictionary of hit/miss/eviction/expiration/invalidation counts, hit_rate, and the current number of
+            entries and their approximate size in bytes
+        """
+        with self._lock:
+            n_lookups = self._stats['hits'] + self._stats['misses']
+            return self._stats | {
+                'hit_rate': self._stats['hits'] / n_lookups if n_lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size
+            }
+
+    # -------- Session events ------------
+    def _track_flush(self, session: orm.Session, flush_context, instances) -> None:
+        pending = session.info.setdefault(self._pending_tables_key, set())
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            mapper = orm.object_mapper(instance)
+            pending.update(table.name for table in mapper.tables)
+            # Changes to many-to-many relationships (e.g., Collection.tags) are written to the secondary table
+            pending.update(r.secondary.name for r in mapper.relationships if r.secondary is not None)
+
+    def _track_execute(self, orm_execute_state: orm.ORMExecuteState) -> None:
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = orm_execute_state.statement.table
+            orm_execute_state.session.info.setdefault(self._pending_tables_key, set()).add(table.name)
+
+    def _commit(self, session: orm.Session) -> None:
+        pending = session.info.pop(self._pending_tables_key, None)
+        if pending:
+            self.invalidate(pending)
+
+    def _rollback(self, session: orm.Session) -> None:
+        session.info.pop(self._pending_tables_key, None)
+
+    def register(self, session_factory: typing.Union[orm.sessionmaker, typing.Type[orm.Session]]) -> None:
+        """
+        Invalidate this cache whenever a session from session_factory commits changes
+        :param session_factory: sessionmaker (or Session class) to listen to
+        """
+        sqla.event.listen(session_factory, 'before_flush', self._track_flush)
+        sqla.event.listen(session_factory, 'do_orm_execute', self._track_execute)
+        sqla.event.listen(session_factory, 'after_commit', self._commit)
+        sqla.event.listen(session_factory, 'after_rollback', self._rollback)
+
+
+query_cache = QueryCache()
+query_cache.register(SessionMaker)
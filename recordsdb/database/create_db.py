@@ -1,5 +1,16 @@
 """
-Create database objects and fill in lookup tables.
+Create database objects and fill in lookup tables. Running this again on an existing database only creates missing
+tables and brings the lookup tables in line with this script and the retention schedule: all lookup tables are synced in
+one transaction, rows that are already up to date are left alone, and only new or changed rows are written. That makes
+it safe to re-run to provision a test or staging database or to apply a new retention schedule. Changes to tables
+that already exist (e.g., partitioning records) aren't made here; run upgrade.py for those first.
+
+NPS file codes are matched to existing rows by nps_item, so a file code keeps its code (and the collections that
+reference it) when the schedule is reordered or reworded. New items get new codes. Items no longer in the schedule are
+not deleted because collections may still reference them.
+
+Usage:
+    create_db.py <retention_schedule_csv>
 
 required params:
     retention_schedule_csv: A .csv file of the latest NPS/DOI retention schedule definitions. Required fields include:
@@ -10,30 +21,47 @@ required params:
             retention_description - length of retention (e.g., 10 years, permanent)
 """
 
-import sys
+import typing
 import pandas as pd
+import sqlalchemy as sqla
 
-import models
-from git.recordsdb.database import engine
-
-
-def main(retention_schedule_csv: str) -> None:
+import recordsdb
+from recordsdb import database
+from recordsdb.database import models
+from recordsdb.file_codes import normalize_nps_item
 
-    # Emit create database DDLs
-    models.BaseModel.metadata.create_all(engine)
 
-    # Add data to lookup tables
-    # nps_file_codes
+def read_retention_schedule(retention_schedule_csv: str) -> pd.DataFrame:
+    """
+    Read and clean up the retention schedule .csv as rows of the nps_file_codes table
+    :param retention_schedule_csv: path to the retention schedule .csv
+    :return: Pandas DataFrame of nps_file_codes rows
+    """
     retention_schedules = pd.read_csv(retention_schedule_csv).dropna(how='any')
     retention_schedules['code'] = retention_schedules.index + 1 # codes start at 1, not 0
     retention_schedules['sort_order'] = retention_schedules.code
-    retention_schedules['retention_years'] = retention_schedules.retention_description.str.extract('(\d+)')
+    retention_schedules['retention_years'] = pd.to_numeric(
+        retention_schedules.retention_description.str.extract(r'(\d+)', expand=False)
+    ).astype('Int64')
 
     # Remove all leading and trailing spaces from str columns
-    for column in retention_schedules.columns[retention_schedules.dtypes == object]:
+    for column in retention_schedules.select_dtypes(include=['object', 'string']).columns:
         retention_schedules[column] = retention_schedules[column].str.strip()
 
-    retention_schedules.to_sql('nps_file_codes', engine, if_exists='append', index=False)
+    return retention_schedules
+
+
+def get_lookup_tables(retention_schedule_csv: typing.Optional[str]=None) -> typing.Dict[str, pd.DataFrame]:
+    """
+    Build the rows of all lookup tables
+    :param retention_schedule_csv: path to the retention schedule .csv. If not given, nps_file_codes is left out
+    :return: dictionary of table_name, Pandas DataFrame of rows
+    """
+    lookup_tables = {}
+
+    # nps_file_codes
+    if retention_schedule_csv:
+        lookup_tables['nps_file_codes'] = read_retention_schedule(retention_schedule_csv)
 
     # park_division_codes
     division_str = '''
@@ -51,8 +79,6 @@ def main(retention_schedule_csv: str) -> None:
     )
     divisions['code'] = divisions.index + 1
     divisions['sort_order'] = divisions.code
-    divisions.drop('short_name', axis=1)\
-        .to_sql('park_division_codes', engine, index=False, if_exists='append')
 
     # program_area_codes
     program_str = '''
@@ -91,10 +117,8 @@ def main(retention_schedule_csv: str) -> None:
     )
     programs['park_division_code'] = \
         programs.merge(divisions, left_on='division_short_name', right_on='short_name').code
-    programs['code'] = divisions.index + 1
-    programs['sort_order'] = divisions.code
-    programs.drop('division_short_name', axis=1)\
-        .to_sql('program_area_codes', engine, index=False, if_exists='append')
+    programs['code'] = programs.index + 1
+    programs['sort_order'] = programs.code
 
     # transfer_location_codes
     transfer_locations = pd.DataFrame(
@@ -102,8 +126,120 @@ def main(retention_schedule_csv: str) -> None:
     )
     transfer_locations['code'] = transfer_locations.index + 1
     transfer_locations['sort_order'] = transfer_locations.code
-    transfer_locations.to_sql('transfer_location_codes', engine, index=False, if_exists='append')
+
+    # Order matters because program_area_codes references park_division_codes
+    lookup_tables |= {
+        'park_division_codes': divisions.drop('short_name', axis=1),
+        'program_area_codes': programs.drop('division_short_name', axis=1),
+        'transfer_location_codes': transfer_locations
+    }
+
+    return lookup_tables
+
+
+def assign_file_codes(incoming: pd.DataFrame, existing: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give each incoming retention schedule row the code of the existing nps_file_codes row with the same nps_item, and
+    new codes (after the highest existing code) to items that aren't in the database yet. Rows are sorted in schedule
+    order, and existing rows that are no longer in the schedule are added after them (in their previous order) so
+    sort_order stays unique
+    :param incoming: result of read_retention_schedule()
+    :param existing: Pandas DataFrame of the rows of nps_file_codes, with at least the nps_item, code, and sort_order
+        columns
+    :return: copy of incoming with codes and sort orders reassigned, plus the rows no longer in the schedule
+    """
+    incoming = incoming.copy()
+    existing_codes = {'.'.join(normalize_nps_item(item)): code for item, code in zip(existing.nps_item, existing.code)}
+    incoming['code'] = incoming.nps_item.map(lambda item: existing_codes.get('.'.join(normalize_nps_item(item))))
+
+    is_new = incoming.code.isna()
+    next_code = int(existing.code.max()) + 1 if len(existing) else 1
+    incoming.loc[is_new, 'code'] = range(next_code, next_code + is_new.sum())
+    incoming['code'] = incoming.code.astype(int)
+    incoming['sort_order'] = range(1, len(incoming) + 1)
+
+    # Items dropped from the schedule aren't deleted because collections may still reference them
+    dropped = existing.loc[~existing.code.isin(incoming.code)]\
+        .sort_values(['sort_order', 'code'], na_position='last')
+    dropped = dropped[[c for c in incoming.columns if c in dropped]].copy()
+    dropped['sort_order'] = range(len(incoming) + 1, len(incoming) + len(dropped) + 1)
+
+    return pd.concat([incoming, dropped], ignore_index=True) if len(dropped) else incoming
+
+
+def sync_lookup_table(conn: sqla.engine.Connection, table_name: str, incoming: pd.DataFrame) -> typing.Dict[str, int]:
+    """
+    Insert new rows and update changed rows of a lookup table, matching rows on code. Rows that already match are
+    not touched and rows in the database that aren't in incoming are left alone
+    :param conn: SQLAlchemy Connection in an open transaction
+    :param table_name: name of the lookup table
+    :param incoming: Pandas DataFrame of rows the table should have
+    :return: dictionary of the number of rows inserted, updated, and unchanged
+    """
+    table = models.BaseModel.metadata.tables[table_name]
+    columns = [c for c in incoming.columns if c in table.c]
+    existing = pd.read_sql(sqla.select(*[table.c[c] for c in columns]), conn)
+
+    # Compare as object columns with None for nulls so e.g. 3 and 3.0 or NaN and None aren't seen as changes
+    def normalize(df: pd.DataFrame) -> pd.DataFrame:
+        return df[columns].astype(object).where(df[columns].notna(), None).set_index('code', drop=False)
+
+    incoming = normalize(incoming)
+    existing = normalize(existing)
+    is_new = ~incoming.index.isin(existing.index)
+    in_both = incoming.loc[~is_new]
+    existing_values = existing.loc[in_both.index, columns]
+    is_changed = ~((in_both == existing_values) | (in_both.isna() & existing_values.isna())).all(axis=1)
+
+    new_rows = incoming.loc[is_new].to_dict('records')
+    changed_rows = [
+        {'_code': code, **row} for code, row in in_both.loc[is_changed].drop(columns='code').iterrows()
+    ]
+    if new_rows:
+        conn.execute(sqla.insert(table), new_rows)
+    if changed_rows:
+        conn.execute(
+            sqla.update(table)
+                .where(table.c.code == sqla.bindparam('_code'))
+                .values({c: sqla.bindparam(c) for c in columns if c != 'code'}),
+            [{k: (v.item() if hasattr(v, 'item') else v) for k, v in row.items()} for row in changed_rows]
+        )
+
+    return {'inserted': len(new_rows), 'updated': len(changed_rows), 'unchanged': int((~is_changed).sum())}
+
+
+def seed_database(
+        db_engine: sqla.engine.Engine,
+        retention_schedule_csv: typing.Optional[str]=None
+) -> typing.Dict[str, typing.Dict[str, int]]:
+    """
+    Create any missing database objects and sync all lookup tables in a single transaction, so a failure leaves the
+    database as it was
+    :param db_engine: SQLAlchemy Engine of the database to seed
+    :param retention_schedule_csv: path to the retention schedule .csv. If not given, nps_file_codes isn't synced
+    :return: dictionary of table_name, dictionary of the number of rows inserted, updated, and unchanged
+    """
+    lookup_tables = get_lookup_tables(retention_schedule_csv)
+
+    table_counts = {}
+    with db_engine.begin() as conn:
+        # Emit create database DDLs. Tables that already exist are skipped
+        models.BaseModel.metadata.create_all(conn)
+        if 'nps_file_codes' in lookup_tables:
+            existing_file_codes = pd.read_sql(sqla.select(models.NPSFileCode.__table__), conn)
+            lookup_tables['nps_file_codes'] = assign_file_codes(lookup_tables['nps_file_codes'], existing_file_codes)
+        for table_name, incoming in lookup_tables.items():
+            table_counts[table_name] = sync_lookup_table(conn, table_name, incoming)
+
+    return table_counts
+
+
+def main(retention_schedule_csv: str) -> None:
+
+    for table_name, counts in seed_database(database.engine, retention_schedule_csv).items():
+        print(f'{table_name}: ' + ', '.join(f'{n} {action}' for action, n in counts.items()))
 
 
 if __name__ == '__main__':
-    sys.exit(main(*sys.argv[1:]))
+    args = recordsdb.get_docopt_args(__doc__)
+    main(**args)
@@ -0,0 +1,137 @@
+"""
+Bulk destruction of collections. The records table is range partitioned on destruction_year: current holdings are in
+records_current (destruction_year 0) and destroyed records live in archive.records_<year> partitions. Destroying
+collections moves all of their records into the archive partition for the year in one UPDATE instead of deleting them
+row by row, and whole years of destroyed records can later be detached from records entirely. Destroyed collections and
+their records drop out of holdings_summary as soon as they're destroyed (see models.HOLDINGS_SUMMARY_DDL), so
+detaching a partition doesn't change the summary.
+
+Databases created before records was partitioned have to be converted with upgrade.py first.
+"""
+
+import typing
+from datetime import datetime
+import sqlalchemy as sqla
+from sqlalchemy import orm
+
+from recordsdb.database import models
+
+
+__all__ = [
+    'ARCHIVE_SCHEMA',
+    'create_archive_partition',
+    'destroy_collections',
+    'detach_archive_partition'
+]
+
+ARCHIVE_SCHEMA = 'archive'
+
+
+def _archive_table_name(destruction_year: int) -> str:
+    destruction_year = int(destruction_year)
+    if destruction_year < 1:
+        raise ValueError(f'Invalid destruction year: {destruction_year}')
+    return f'{ARCHIVE_SCHEMA}.records_{destruction_year}'
+
+
+def _is_postgresql(session: typing.Union[orm.Session, sqla.engine.Connection]) -> bool:
+    bind = session.get_bind() if isinstance(session, orm.Session) else session
+    return bind.dialect.name == 'postgresql'
+
+
+def _check_partitioned(session: typing.Union[orm.Session, sqla.engine.Connection]) -> None:
+    is_partitioned = session.execute(sqla.text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = 'records'::regclass"
+    )).scalar()
+    if not is_partitioned:
+        raise RuntimeError(
+            'The records table is not partitioned. Run recordsdb/database/upgrade.py to convert it first'
+        )
+
+
+def create_archive_partition(session: typing.Union[orm.Session, sqla.engine.Connection], destruction_year: int) -> str:
+    """
+    Create the archive partition of records for a destruction year if it doesn't exist yet
+    :param session: SQLAlchemy Session or Connection in an open transaction
+    :param destruction_year: year the records were destroyed
+    :return: schema-qualified name of the partition
+    """
+    table_name = _archive_table_name(destruction_year)
+    if _is_postgresql(session):
+        _check_partitioned(session)
+        session.execute(sqla.text(
+            f'CREATE TABLE IF NOT EXISTS {table_name} PARTITION OF records'
+            f' FOR VALUES FROM ({int(destruction_year)}) TO ({int(destruction_year) + 1})'
+        ))
+
+    return table_name
+
+
+def destroy_collections(
+        session: orm.Session,
+        collection_ids: typing.Sequence[int],
+        destruction_request_id: typing.Optional[int]=None,
+        destruction_year: typing.Optional[int]=None,
+        destroyed_by: typing.Optional[str]=None
+) -> int:
+    """
+    Mark collections as destroyed and move all of their records to the archive partition for the destruction year
+    in a single set-based UPDATE. Postgres moves the rows between partitions, so records_current no longer contains
+    them. A destroyed_collections row is added for each collection, which is what takes the collection out of
+    holdings_summary.
+    :param session: SQLAlchemy Session in an open transaction
+    :param collection_ids: ids of the collections that were destroyed
+    :param destruction_request_id: destruction request to link the destroyed_collections rows to, if any
+    :param destruction_year: year the records were destroyed. Defaults to the current year
+    :param destroyed_by: username to record as created_by/last_modified_by
+    :return: number of records moved to the archive
+    """
+    now = datetime.now()
+    destruction_year = destruction_year or now.year
+    collection_ids = list(collection_ids)
+    if not collection_ids:
+        return 0
+
+    create_archive_partition(session, destruction_year)
+    result = session.execute(
+        sqla.update(models.Record)
+            .where(models.Record.collection_id.in_(collection_ids))
+            .where(models.Record.destruction_year == 0)
+            .values(destruction_year=destruction_year, last_modified_by=destroyed_by, last_modified_time=now)
+            .execution_options(synchronize_session=False)
+    )
+
+    session.execute(
+        sqla.insert(models.DestroyedCollection),
+        [
+            {
+                'destruction_request_id': destruction_request_id,
+                'collection_id': collection_id,
+                'created_by': destroyed_by,
+                'create_time': now,
+                'last_modified_by': destroyed_by,
+                'last_modified_time': now
+            }
+            for collection_id in collection_ids
+        ]
+    )
+
+    return result.rowcount
+
+
+def detach_archive_partition(session: typing.Union[orm.Session, sqla.engine.Connection], destruction_year: int) -> str:
+    """
+    Detach the archive partition for a destruction year from records so it's no longer part of the records table at
+    all. The detached table stays in the archive schema where it can be exported or dropped. Its records were already
+    taken out of holdings_summary when they were destroyed.
+    :param session: SQLAlchemy Session or Connection in an open transaction
+    :param destruction_year: year of the partition to detach
+    :return: schema-qualified name of the detached table
+    """
+    table_name = _archive_table_name(destruction_year)
+    if not _is_postgresql(session):
+        raise RuntimeError('Detaching archive partitions is only supported with PostgreSQL')
+    _check_partitioned(session)
+    session.execute(sqla.text(f'ALTER TABLE records DETACH PARTITION {table_name}'))
+
+    return table_name
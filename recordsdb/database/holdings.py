@@ -0,0 +1,199 @@
+"""
+Query holdings totals (cubic feet, collection counts, and record counts) from the holdings_summary table. The table
+is kept up to date by triggers on collections and records (see models.HOLDINGS_SUMMARY_DDL), so these queries only
+read the summary rows rather than scanning collections and records. The triggers only exist in PostgreSQL, so on other
+databases (i.e., SQLite for tests) the same rows are computed from collections and records on every query instead.
+
+The triggers append their changes to holdings_summary_deltas, and compact_holdings_summary() adds those to
+holdings_summary in a short transaction of its own. Imports compact when they finish. Queries include any deltas that
+are still pending, so totals are always current, and compacting only keeps the number of pending deltas small.
+"""
+
+import typing
+import pandas as pd
+import sqlalchemy as sqla
+from sqlalchemy import orm
+
+from recordsdb.database import models
+
+
+__all__ = [
+    'SUMMARY_FIELDS',
+    'compact_holdings_summary',
+    'get_holdings_summary',
+    'refresh_holdings_summary'
+]
+
+# First key of the two-key advisory lock taken while compacting, so only one compaction runs at a time
+COMPACT_LOCK_NAMESPACE = 'recordsdb.holdings_summary'
+
+def _get_summary_fields(summary: typing.Union[sqla.Table, sqla.Subquery]) -> typing.Dict[str, sqla.ColumnElement]:
+    return {
+        'park_division_code': sqla.func.coalesce(models.ProgramAreaCode.park_division_code, 0),
+        'program_area_code':  summary.c.program_area_code,
+        'nps_file_code':      summary.c.nps_file_code,
+        'year':               summary.c.year
+    }
+
+
+# Fields that totals can be grouped by or filtered on
+SUMMARY_FIELDS = _get_summary_fields(models.HoldingsSummary.__table__)
+
+
+def _get_dialect_name(conn: typing.Union[sqla.engine.Connection, orm.Session]) -> str:
+    bind = conn.get_bind() if isinstance(conn, orm.Session) else conn
+    return bind.dialect.name
+
+
+def _select_holdings() -> sqla.Select:
+    """
+    Get a select statement that computes the rows of holdings_summary from collections and records, counting only
+    current holdings like the triggers do
+    """
+    year = sqla.cast(sqla.extract('year', models.Collection.end_date), sqla.Integer)
+    record_counts = sqla.select(models.Record.collection_id, sqla.func.count().label('record_count'))\
+        .where(models.Record.destruction_year == 0)\
+        .group_by(models.Record.collection_id)\
+        .subquery()
+    group_columns = [
+        sqla.func.coalesce(models.Collection.program_area_code, 0).label('program_area_code'),
+        sqla.func.coalesce(models.Collection.nps_file_code, 0).label('nps_file_code'),
+        sqla.func.coalesce(year, 0).label('year')
+    ]
+
+    return sqla.select(
+            *group_columns,
+            sqla.func.count().label('collection_count'),
+            sqla.func.coalesce(sqla.func.sum(models.Collection.volume_cu_ft), 0).label('volume_cu_ft'),
+            sqla.func.coalesce(sqla.func.sum(record_counts.c.record_count), 0).label('record_count')
+        )\
+        .outerjoin(record_counts, record_counts.c.collection_id == models.Collection.id)\
+        .where(
+            ~sqla.exists().where(models.DestroyedCollection.collection_id == models.Collection.id)
+        )\
+        .group_by(*group_columns)
+
+
+def get_holdings_summary(
+        conn: sqla.engine.Connection,
+        by: typing.Sequence[str]=('park_division_code', 'program_area_code', 'nps_file_code', 'year'),
+        **filters
+) -> pd.DataFrame:
+    """
+    Get holdings totals grouped by any of the SUMMARY_FIELDS. Missing codes and years are reported as 0.
+
+    Example: total cubic feet by division for 2020
+        get_holdings_summary(conn, by=['park_division_code'], year=2020)
+
+    :param conn: SQLAlchemy Connection or Session
+    :param by: field names from SUMMARY_FIELDS to group by
+    :param filters: field_name=value pairs to restrict the totals to. Values can be a single value or a list
+    :return: Pandas DataFrame with the 'by' fields and collection_count, volume_cu_ft, and record_count
+    """
+    unknown_fields = [f for f in list(by) + list(filters) if f not in SUMMARY_FIELDS]
+    if unknown_fields:
+        raise ValueError(f'Unknown summary field(s): {", ".join(unknown_fields)}')
+
+    if _get_dialect_name(conn) == 'postgresql':
+        # Changes that haven't been compacted yet are still in holdings_summary_deltas
+        summary_columns = [c.name for c in models.HoldingsSummary.__table__.c]
+        summary = sqla.union_all(
+                sqla.select(*[models.HoldingsSummary.__table__.c[c] for c in summary_columns]),
+                sqla.select(*[models.HoldingsSummaryDelta.__table__.c[c] for c in summary_columns])
+            )\
+            .subquery('holdings_summary')
+    else:
+        # holdings_summary isn't maintained without triggers
+        summary = _select_holdings().subquery('holdings_summary')
+    summary_fields = _get_summary_fields(summary)
+
+    group_columns = [summary_fields[field_name].label(field_name) for field_name in by]
+    totals = [
+        sqla.func.sum(summary.c.collection_count).label('collection_count'),
+        sqla.func.sum(summary.c.volume_cu_ft).label('volume_cu_ft'),
+        sqla.func.sum(summary.c.record_count).label('record_count')
+    ]
+    statement = sqla.select(*group_columns, *totals)\
+        .select_from(summary)\
+        .outerjoin(
+            models.ProgramAreaCode,
+            models.ProgramAreaCode.code == summary.c.program_area_code
+        )\
+        .group_by(*group_columns)\
+        .having(sqla.or_(*[total != 0 for total in totals]))\
+        .order_by(*group_columns)
+
+    for field_name, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            statement = statement.where(summary_fields[field_name].in_(value))
+        else:
+            statement = statement.where(summary_fields[field_name] == value)
+
+    if isinstance(conn, orm.Session):
+        conn = conn.connection()
+
+    return pd.read_sql(statement, conn)
+
+
+def _lock_compaction(conn: sqla.engine.Connection, wait: bool) -> bool:
+    lock_function = 'pg_advisory_xact_lock' if wait else 'pg_try_advisory_xact_lock'
+    result = conn.execute(
+        sqla.text(f'SELECT {lock_function}(hashtext(:namespace), 0)'),
+        {'namespace': COMPACT_LOCK_NAMESPACE}
+    ).scalar()
+
+    # pg_advisory_xact_lock returns void once it has the lock
+    return True if wait else bool(result)
+
+
+def compact_holdings_summary(conn: sqla.engine.Connection) -> bool:
+    """
+    Add the pending rows of holdings_summary_deltas to holdings_summary and delete them. Commit soon after this: the
+    holdings_summary rows it changes stay locked until the transaction ends. If another compaction is already
+    running, nothing is done since that one or the next will pick up the deltas. Does nothing on databases without
+    the triggers
+    :param conn: SQLAlchemy Connection in an open transaction
+    :return: True if the deltas were compacted
+    """
+    if _get_dialect_name(conn) != 'postgresql' or not _lock_compaction(conn, wait=False):
+        return False
+
+    conn.execute(sqla.text('''
+        WITH moved AS (
+            DELETE FROM holdings_summary_deltas
+            RETURNING program_area_code, nps_file_code, year, collection_count, volume_cu_ft, record_count
+        )
+        INSERT INTO holdings_summary AS s
+            (program_area_code, nps_file_code, year, collection_count, volume_cu_ft, record_count)
+        SELECT program_area_code, nps_file_code, year, sum(collection_count), sum(volume_cu_ft), sum(record_count)
+        FROM moved
+        GROUP BY program_area_code, nps_file_code, year
+        ON CONFLICT (program_area_code, nps_file_code, year) DO UPDATE SET
+            collection_count = s.collection_count + excluded.collection_count,
+            volume_cu_ft = s.volume_cu_ft + excluded.volume_cu_ft,
+            record_count = s.record_count + excluded.record_count
+    '''))
+    # Don't keep empty rows around after deletes and reassignments
+    conn.execute(sqla.text(
+        'DELETE FROM holdings_summary WHERE collection_count = 0 AND volume_cu_ft = 0 AND record_count = 0'
+    ))
+
+    return True
+
+
+def refresh_holdings_summary(conn: sqla.engine.Connection) -> None:
+    """
+    Rebuild holdings_summary from scratch and clear holdings_summary_deltas. Only needed for existing databases when
+    the summary table is first added (or if the triggers were disabled); normal inserts, updates, and deletes keep it
+    current. Like the triggers, only current records of collections that haven't been destroyed are counted.
+    :param conn: SQLAlchemy Connection or Session in an open transaction
+    """
+    if _get_dialect_name(conn) == 'postgresql':
+        _lock_compaction(conn, wait=True)
+        conn.execute(sqla.text('LOCK TABLE collections, records, destroyed_collections IN SHARE MODE'))
+    conn.execute(sqla.delete(models.HoldingsSummaryDelta))
+    conn.execute(sqla.delete(models.HoldingsSummary))
+    holdings = _select_holdings()
+    conn.execute(
+        sqla.insert(models.HoldingsSummary).from_select([c.name for c in holdings.selected_columns], holdings)
+    )
@@ -0,0 +1,70 @@
+"""
+Transaction-scoped advisory locks so concurrent workers can coordinate on a single ARCIS transfer without locking
+whole tables. Locks are released automatically when the transaction commits or rolls back. On databases without
+advisory locks (SQLite), writers are already serialized by the database, so locking always succeeds.
+"""
+
+import typing
+import sqlalchemy as sqla
+from sqlalchemy import orm
+
+
+__all__ = [
+    'acquire_transfer_lock',
+    'insert_on_conflict_do_nothing'
+]
+
+# First key of the two-key advisory lock, so transfer locks can't collide with advisory locks taken for other purposes
+TRANSFER_LOCK_NAMESPACE = 'recordsdb.arcis_transfer_number'
+
+
+def _get_dialect_name(session: typing.Union[orm.Session, sqla.engine.Connection]) -> str:
+    bind = session.get_bind() if isinstance(session, orm.Session) else session
+    return bind.dialect.name
+
+
+def acquire_transfer_lock(
+        session: typing.Union[orm.Session, sqla.engine.Connection],
+        transfer_number: str,
+        wait: bool=False
+) -> bool:
+    """
+    Take a transaction-scoped lock on an ARCIS transfer number
+    :param session: SQLAlchemy Session or Connection in an open transaction
+    :param transfer_number: ARCIS transfer number to lock
+    :param wait: if True, block until the lock is available. Otherwise return False right away if another
+        transaction holds it
+    :return: True if the lock was acquired
+    """
+    if _get_dialect_name(session) != 'postgresql':
+        return True
+
+    lock_function = 'pg_advisory_xact_lock' if wait else 'pg_try_advisory_xact_lock'
+    result = session.execute(
+        sqla.text(f'SELECT {lock_function}(hashtext(:namespace), hashtext(:transfer_number))'),
+        {'namespace': TRANSFER_LOCK_NAMESPACE, 'transfer_number': transfer_number}
+    ).scalar()
+
+    # pg_advisory_xact_lock returns void once it has the lock
+    return True if wait else bool(result)
+
+
+def insert_on_conflict_do_nothing(
+        session: typing.Union[orm.Session, sqla.engine.Connection],
+        table: sqla.Table
+) -> sqla.Insert:
+    """
+    Get an INSERT ... ON CONFLICT DO NOTHING statement for the session's database
+    :param session: SQLAlchemy Session or Connection
+    :param table: table to insert into
+    :return: insert statement
+    """
+    dialect_name = _get_dialect_name(session)
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'ON CONFLICT is not supported for {dialect_name}')
+
+    return insert(table).on_conflict_do_nothing()
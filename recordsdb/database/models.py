@@ -3,7 +3,7 @@ from typing import Optional
 from datetime import datetime
 import sqlalchemy as sqla
 from sqlalchemy import orm
-from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
 
 
 __all__ = [
@@ -19,9 +19,22 @@ __all__ = [
     'RecordTransferFolder',
     'Record',
     'DestructionRequest',
-    'DestroyedCollection'
+    'DestroyedCollection',
+    'HoldingsSummary'
 ]
 
+@compiles(sqla.PrimaryKeyConstraint, 'sqlite')
+def _compile_sqlite_primary_key(constraint, compiler, **kwargs):
+    """
+    SQLite doesn't partition tables and only generates ids for a single integer primary key column, so leave
+    partition keys out of primary keys
+    """
+    columns = [c for c in constraint.columns if not c.info.get('partition_key')]
+    if len(columns) < len(constraint.columns):
+        return 'PRIMARY KEY ({})'.format(', '.join(compiler.preparer.quote(c.name) for c in columns))
+    return compiler.visit_primary_key_constraint(constraint, **kwargs)
+
+
 # class BaseModel(DeclarativeBase):
 #     pass
 BaseModel = orm.declarative_base()
@@ -43,9 +56,9 @@ class DataTableMixin:
     """Mixin for all data tables, so they'll all have created/modified meta fields"""
     id:                 orm.Mapped[int] = sqla.Column(sqla.Integer, primary_key=True)
     created_by:         orm.Mapped[str] = sqla.Column(sqla.String(50))
-    create_time:        orm.Mapped[datetime] = sqla.Column(postgresql.TIMESTAMP)
+    create_time:        orm.Mapped[datetime] = sqla.Column(sqla.DateTime)
     last_modified_by:   orm.Mapped[str] = sqla.Column(sqla.String(50))
-    last_modified_time:     orm.Mapped[datetime] = sqla.Column(postgresql.TIMESTAMP)
+    last_modified_time:     orm.Mapped[datetime] = sqla.Column(sqla.DateTime)
 
 
 # -------- Lookup tables ------------
@@ -92,10 +105,10 @@ class Collection(DataTableMixin, BaseModel):
         sqla.Integer,
         sqla.ForeignKey('nps_file_codes.code', onupdate='CASCADE', ondelete='RESTRICT')
     )
-    description:        orm.Mapped[str] = sqla.Column(postgresql.TEXT)
-    start_date:         orm.Mapped[datetime] = sqla.Column(postgresql.DATE)
-    end_date:           orm.Mapped[datetime] = sqla.Column(postgresql.DATE)
-    retention_date:     orm.Mapped[datetime] = sqla.Column(postgresql.DATE)
+    description:        orm.Mapped[str] = sqla.Column(sqla.Text)
+    start_date:         orm.Mapped[datetime] = sqla.Column(sqla.Date)
+    end_date:           orm.Mapped[datetime] = sqla.Column(sqla.Date)
+    retention_date:     orm.Mapped[datetime] = sqla.Column(sqla.Date)
     source_file:        orm.Mapped[str] = sqla.Column(sqla.String(255), nullable=True)
     volume_cu_ft:       orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=True)
     media_type:         orm.Mapped[str] = sqla.Column(sqla.String(50))
@@ -109,9 +122,9 @@ class Collection(DataTableMixin, BaseModel):
         sqla.ForeignKey('transfer_location_codes.code', onupdate='CASCADE', ondelete='RESTRICT')
     )
     prepared_by:            orm.Mapped[str] = sqla.Column(sqla.String(50), nullable=True)
-    prepared_date:          orm.Mapped[datetime] = sqla.Column(postgresql.DATE, nullable=True)
+    prepared_date:          orm.Mapped[datetime] = sqla.Column(sqla.Date, nullable=True)
     arcis_transfer_number:  orm.Mapped[str] = sqla.Column(sqla.String(50), nullable=True, unique=True)
-    disposition_date:       orm.Mapped[datetime] = sqla.Column(postgresql.DATE, nullable=True)
+    disposition_date:       orm.Mapped[datetime] = sqla.Column(sqla.Date, nullable=True)
     sf135_path:             orm.Mapped[str] = sqla.Column(sqla.String(255), nullable=True)
     box_inventory_path:     orm.Mapped[str] = sqla.Column(sqla.String(255), nullable=True)
 
@@ -165,9 +178,13 @@ class CollectionTag(BaseModel):
 
 class RecordTransferBox(BaseModel):
     __tablename__ = 'record_transfer_boxes'
+    __table_args__ = (
+        # keyset pagination order for browsing boxes (see browse.py)
+        sqla.Index('ix_record_transfer_boxes_collection_box', 'collection_id', 'box_number', 'id'),
+    )
 
     id:         orm.Mapped[int] = sqla.Column(sqla.Integer, primary_key=True)
-    box_number: orm.Mapped[int] = sqla.Column(sqla.Integer)
+    box_number: orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
     collection_id: orm.Mapped[int] = sqla.Column(
         sqla.Integer,
         sqla.ForeignKey('collections.id', onupdate='CASCADE', ondelete='CASCADE')
@@ -179,13 +196,27 @@ class RecordTransferBox(BaseModel):
 
 class RecordTransferFolder(BaseModel):
     __tablename__ = 'record_transfer_folders'
+    __table_args__ = (
+        sqla.Index('ix_record_transfer_folders_box_folder', 'box_id', 'folder_number', 'id'),
+        # keyset pagination order for browsing folders (see browse.py)
+        sqla.Index(
+            'ix_record_transfer_folders_collection_box_folder', 'collection_id', 'box_number', 'folder_number', 'id'
+        ),
+    )
 
     id:            orm.Mapped[int] = sqla.Column(sqla.Integer, primary_key=True)
-    folder_number: orm.Mapped[int] = sqla.Column(sqla.Integer)
+    folder_number: orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
     box_id:        orm.Mapped[int] = sqla.Column(
         sqla.Integer,
         sqla.ForeignKey('record_transfer_boxes.id', onupdate='CASCADE', ondelete='CASCADE')
     )
+    # Copied from the folder's box so folders can be browsed in box order from this table's index alone. Kept in sync
+    #   by triggers (see BROWSE_KEYS_DDL)
+    collection_id: orm.Mapped[int] = sqla.Column(
+        sqla.Integer,
+        sqla.ForeignKey('collections.id', onupdate='CASCADE', ondelete='CASCADE')
+    )
+    box_number:    orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
 
     # ORM attributes
     records: orm.Mapped[list['Record']] = orm.relationship(
@@ -198,6 +229,30 @@ class RecordTransferFolder(BaseModel):
 
 class Record(DataTableMixin, BaseModel):
     __tablename__ = 'records'
+    __table_args__ = (
+        # For the cascade when a folder is deleted. Browsing uses ix_records_collection_box_folder instead
+        sqla.Index('ix_records_folder_id', 'folder_id'),
+        # keyset pagination order for browsing records (see browse.py), also covering the columns returned
+        sqla.Index(
+            'ix_records_collection_box_folder',
+            'collection_id',
+            'box_number',
+            'folder_number',
+            'id',
+            postgresql_include=['folder_id', 'file_title', 'start_date', 'end_date', 'cutoff_date']
+        ),
+        # Records still in the park's custody are in the records_current partition (destruction_year 0). Destroyed
+        #   records are moved to a partition per destruction year in the archive schema (see destruction.py), so
+        #   queries on current holdings only scan records_current
+        {'postgresql_partition_by': 'RANGE (destruction_year)'}
+    )
+
+    id:             orm.Mapped[int] = sqla.Column(sqla.Integer, sqla.Identity(), primary_key=True)
+    destruction_year: orm.Mapped[int] = sqla.Column(
+        sqla.Integer, primary_key=True, nullable=False, default=0, server_default='0', info={'partition_key': True}
+    )
+    # The partition key has to be part of the primary key, but the ORM still identifies records by id alone
+    __mapper_args__ = {'primary_key': [id]}
 
     collection_id:  orm.Mapped[int] = sqla.Column(
         sqla.Integer,
@@ -209,11 +264,15 @@ class Record(DataTableMixin, BaseModel):
         sqla.Integer,
         sqla.ForeignKey('record_transfer_folders.id', onupdate='CASCADE', ondelete='CASCADE')
     )
+    # Copied from the record's folder so records can be browsed in box/folder order from this table's index alone.
+    #   Kept in sync by triggers (see BROWSE_KEYS_DDL)
+    box_number:     orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
+    folder_number:  orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
     file_title:     orm.Mapped[str] = sqla.Column(sqla.String(255))
-    start_date:     orm.Mapped[datetime] = sqla.Column(postgresql.DATE)
-    end_date:       orm.Mapped[datetime] = sqla.Column(postgresql.DATE)
-    cutoff_date:    orm.Mapped[datetime] = sqla.Column(postgresql.DATE)
-    description:    orm.Mapped[str] = sqla.Column(postgresql.TEXT)
+    start_date:     orm.Mapped[datetime] = sqla.Column(sqla.Date)
+    end_date:       orm.Mapped[datetime] = sqla.Column(sqla.Date)
+    cutoff_date:    orm.Mapped[datetime] = sqla.Column(sqla.Date)
+    description:    orm.Mapped[str] = sqla.Column(sqla.Text)
 
     # ORM attributes
     collection: orm.Mapped['Collection'] = orm.relationship(
@@ -227,6 +286,16 @@ class Record(DataTableMixin, BaseModel):
         return f'Record(id={self.id!r}, collection_id={self.collection_id!r}, file_title={self.file_title!r})'
 
 
+sqla.event.listen(
+    Record.__table__,
+    'after_create',
+    sqla.DDL(
+        'CREATE SCHEMA IF NOT EXISTS archive;'
+        ' CREATE TABLE records_current PARTITION OF records FOR VALUES FROM (0) TO (1)'
+    ).execute_if(dialect='postgresql')
+)
+
+
 class DestructionRequest(DataTableMixin, BaseModel):
 
     __tablename__ = 'destruction_requests'
@@ -269,3 +338,320 @@ class DestroyedCollection(DataTableMixin, BaseModel):
 
     def __repr__(self) -> str:
         return f'DestructionRequest(id={self.id!r}, destruction_request_id={self.destruction_request_id!r}, collection_id={self.collection_id!r})'
+
+
+
+# -------- Summary tables ------------
+class HoldingsSummary(BaseModel):
+    """
+    Running totals of current holdings by program area, file code, and year (of the collection end date), kept up to
+    date by triggers on collections, records, and destroyed_collections (by way of holdings_summary_deltas).
+    Destroyed collections and records aren't counted. Missing codes and years are stored as 0 so they can be part of
+    the key. Division totals come from joining program_area_codes.
+    """
+    __tablename__ = 'holdings_summary'
+
+    program_area_code:  orm.Mapped[int] = sqla.Column(sqla.Integer, primary_key=True)
+    nps_file_code:      orm.Mapped[int] = sqla.Column(sqla.Integer, primary_key=True)
+    year:               orm.Mapped[int] = sqla.Column(sqla.Integer, primary_key=True)
+    collection_count:   orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False, default=0)
+    volume_cu_ft:       orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False, default=0)
+    record_count:       orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f'HoldingsSummary(program_area_code={self.program_area_code!r}, nps_file_code={self.nps_file_code!r},'
+            f' year={self.year!r}, collection_count={self.collection_count!r}, volume_cu_ft={self.volume_cu_ft!r},'
+            f' record_count={self.record_count!r})'
+        )
+
+
+class HoldingsSummaryDelta(BaseModel):
+    """
+    Changes to holdings_summary that haven't been added to it yet. The triggers only ever insert rows here, so
+    transactions that change holdings with the same key (e.g., two imports of different transfers in the same program
+    area, file code, and year) don't wait on each other for the summary row. holdings.compact_holdings_summary() adds
+    them to holdings_summary, and holdings.get_holdings_summary() includes any that are still pending.
+    """
+    __tablename__ = 'holdings_summary_deltas'
+
+    id:                 orm.Mapped[int] = sqla.Column(sqla.BigInteger, sqla.Identity(), primary_key=True)
+    program_area_code:  orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
+    nps_file_code:      orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
+    year:               orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False)
+    collection_count:   orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False, default=0)
+    volume_cu_ft:       orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False, default=0)
+    record_count:       orm.Mapped[int] = sqla.Column(sqla.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f'HoldingsSummaryDelta(id={self.id!r}, program_area_code={self.program_area_code!r},'
+            f' nps_file_code={self.nps_file_code!r}, year={self.year!r}, collection_count={self.collection_count!r},'
+            f' volume_cu_ft={self.volume_cu_ft!r}, record_count={self.record_count!r})'
+        )
+
+
+# Triggers to maintain holdings_summary. These run after every create_all() (not just when the tables are created), so
+#   they have to be safe to re-run. Collections use a BEFORE row trigger for updates and deletes so a collection's
+#   records can still be counted before a delete cascades to them. Inserts use an AFTER row trigger instead because
+#   BEFORE INSERT triggers also fire for rows that INSERT ... ON CONFLICT DO NOTHING then skips (see
+#   import_transferred_records.insert_collection()). Records use statement triggers with transition tables so a bulk insert
+#   of a box inventory is one aggregated update instead of one per row. Records whose collection is gone (i.e., the
+#   cascade from a collection delete) are already accounted for and are skipped by the join.
+#
+#   Only current holdings are counted: records with destruction_year 0 in collections without a destroyed_collections
+#   row. Moving records to an archive partition is an UPDATE of destruction_year, which takes them out of the counts,
+#   so detaching an archive partition later doesn't change the summary. Adding a collection's first
+#   destroyed_collections row takes its count and volume out, and removing its last one puts them back.
+#
+#   All changes go through holdings_summary_apply(), which appends them to holdings_summary_deltas instead of updating
+#   holdings_summary itself. Updating the summary row directly would lock it until the transaction commits, so every
+#   import with the same program area, file code, and year would wait for the one before it to finish.
+HOLDINGS_SUMMARY_DDL = [
+    '''
+    CREATE OR REPLACE FUNCTION holdings_summary_apply(
+        _program_area_code integer,
+        _nps_file_code integer,
+        _year integer,
+        _collection_count integer,
+        _volume_cu_ft integer,
+        _record_count integer
+    ) RETURNS void AS $$
+    BEGIN
+        INSERT INTO holdings_summary_deltas
+            (program_area_code, nps_file_code, year, collection_count, volume_cu_ft, record_count)
+        VALUES (
+            coalesce(_program_area_code, 0),
+            coalesce(_nps_file_code, 0),
+            coalesce(_year, 0),
+            _collection_count,
+            coalesce(_volume_cu_ft, 0),
+            _record_count
+        );
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION holdings_summary_collection_changed() RETURNS trigger AS $$
+    DECLARE
+        n_records integer;
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM destroyed_collections
+            WHERE collection_id = CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END
+        ) THEN
+            IF TG_OP = 'DELETE' THEN
+                RETURN OLD;
+            END IF;
+            RETURN NEW;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            SELECT count(*) INTO n_records FROM records WHERE collection_id = OLD.id AND destruction_year = 0;
+            PERFORM holdings_summary_apply(
+                OLD.program_area_code, OLD.nps_file_code, extract(year FROM OLD.end_date)::integer,
+                -1, -OLD.volume_cu_ft, -n_records
+            );
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT count(*) INTO n_records FROM records WHERE collection_id = NEW.id AND destruction_year = 0;
+            PERFORM holdings_summary_apply(
+                NEW.program_area_code, NEW.nps_file_code, extract(year FROM NEW.end_date)::integer,
+                1, NEW.volume_cu_ft, n_records
+            );
+            RETURN NEW;
+        END IF;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION holdings_summary_records_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM holdings_summary_apply(
+                c.program_area_code, c.nps_file_code, extract(year FROM c.end_date)::integer, 0, 0, -count(*)::integer
+            )
+            FROM old_records r JOIN collections c ON c.id = r.collection_id
+            WHERE
+                r.destruction_year = 0 AND
+                NOT EXISTS (SELECT 1 FROM destroyed_collections d WHERE d.collection_id = c.id)
+            GROUP BY c.program_area_code, c.nps_file_code, extract(year FROM c.end_date);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM holdings_summary_apply(
+                c.program_area_code, c.nps_file_code, extract(year FROM c.end_date)::integer, 0, 0, count(*)::integer
+            )
+            FROM new_records r JOIN collections c ON c.id = r.collection_id
+            WHERE
+                r.destruction_year = 0 AND
+                NOT EXISTS (SELECT 1 FROM destroyed_collections d WHERE d.collection_id = c.id)
+            GROUP BY c.program_area_code, c.nps_file_code, extract(year FROM c.end_date);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION holdings_summary_destroyed_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            -- Only collections that weren't already destroyed
+            PERFORM holdings_summary_apply(
+                c.program_area_code, c.nps_file_code, extract(year FROM c.end_date)::integer,
+                -1, -c.volume_cu_ft,
+                -(SELECT count(*) FROM records r WHERE r.collection_id = c.id AND r.destruction_year = 0)::integer
+            )
+            FROM collections c
+            WHERE
+                c.id IN (SELECT collection_id FROM new_destroyed) AND
+                (SELECT count(*) FROM destroyed_collections d WHERE d.collection_id = c.id) =
+                    (SELECT count(*) FROM new_destroyed d WHERE d.collection_id = c.id);
+        ELSE
+            -- Only collections that are no longer destroyed at all
+            PERFORM holdings_summary_apply(
+                c.program_area_code, c.nps_file_code, extract(year FROM c.end_date)::integer,
+                1, c.volume_cu_ft,
+                (SELECT count(*) FROM records r WHERE r.collection_id = c.id AND r.destruction_year = 0)::integer
+            )
+            FROM collections c
+            WHERE
+                c.id IN (SELECT collection_id FROM old_destroyed) AND
+                NOT EXISTS (SELECT 1 FROM destroyed_collections d WHERE d.collection_id = c.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS collections_holdings_summary ON collections;
+    CREATE TRIGGER collections_holdings_summary
+        BEFORE DELETE OR UPDATE OF program_area_code, nps_file_code, end_date, volume_cu_ft ON collections
+        FOR EACH ROW EXECUTE FUNCTION holdings_summary_collection_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS collections_holdings_summary_insert ON collections;
+    CREATE TRIGGER collections_holdings_summary_insert
+        AFTER INSERT ON collections
+        FOR EACH ROW EXECUTE FUNCTION holdings_summary_collection_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS records_holdings_summary_insert ON records;
+    CREATE TRIGGER records_holdings_summary_insert
+        AFTER INSERT ON records REFERENCING NEW TABLE AS new_records
+        FOR EACH STATEMENT EXECUTE FUNCTION holdings_summary_records_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS records_holdings_summary_update ON records;
+    CREATE TRIGGER records_holdings_summary_update
+        AFTER UPDATE ON records REFERENCING OLD TABLE AS old_records NEW TABLE AS new_records
+        FOR EACH STATEMENT EXECUTE FUNCTION holdings_summary_records_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS records_holdings_summary_delete ON records;
+    CREATE TRIGGER records_holdings_summary_delete
+        AFTER DELETE ON records REFERENCING OLD TABLE AS old_records
+        FOR EACH STATEMENT EXECUTE FUNCTION holdings_summary_records_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS destroyed_collections_holdings_summary_insert ON destroyed_collections;
+    CREATE TRIGGER destroyed_collections_holdings_summary_insert
+        AFTER INSERT ON destroyed_collections REFERENCING NEW TABLE AS new_destroyed
+        FOR EACH STATEMENT EXECUTE FUNCTION holdings_summary_destroyed_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS destroyed_collections_holdings_summary_delete ON destroyed_collections;
+    CREATE TRIGGER destroyed_collections_holdings_summary_delete
+        AFTER DELETE ON destroyed_collections REFERENCING OLD TABLE AS old_destroyed
+        FOR EACH STATEMENT EXECUTE FUNCTION holdings_summary_destroyed_changed()
+    '''
+]
+
+for _statement in HOLDINGS_SUMMARY_DDL:
+    sqla.event.listen(
+        BaseModel.metadata,
+        'after_create',
+        sqla.DDL(_statement).execute_if(dialect='postgresql')
+    )
+
+
+# Triggers to keep the copies of box and folder keys on record_transfer_folders and records in sync with the boxes and
+#   folders they belong to. New rows get them from their parent and changes to a box or folder are passed down to its
+#   children. Without triggers (i.e., SQLite), whatever inserts folders and records has to fill them in
+BROWSE_KEYS_DDL = [
+    '''
+    CREATE OR REPLACE FUNCTION record_transfer_folders_get_box_keys() RETURNS trigger AS $$
+    BEGIN
+        SELECT collection_id, box_number INTO NEW.collection_id, NEW.box_number
+        FROM record_transfer_boxes WHERE id = NEW.box_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION records_get_folder_keys() RETURNS trigger AS $$
+    BEGIN
+        SELECT collection_id, box_number, folder_number INTO NEW.collection_id, NEW.box_number, NEW.folder_number
+        FROM record_transfer_folders WHERE id = NEW.folder_id;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION record_transfer_boxes_keys_changed() RETURNS trigger AS $$
+    BEGIN
+        UPDATE record_transfer_folders SET collection_id = NEW.collection_id, box_number = NEW.box_number
+        WHERE box_id = NEW.id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION record_transfer_folders_keys_changed() RETURNS trigger AS $$
+    BEGIN
+        UPDATE records
+        SET collection_id = NEW.collection_id, box_number = NEW.box_number, folder_number = NEW.folder_number
+        WHERE folder_id = NEW.id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS record_transfer_folders_get_box_keys ON record_transfer_folders;
+    CREATE TRIGGER record_transfer_folders_get_box_keys
+        BEFORE INSERT OR UPDATE OF box_id ON record_transfer_folders
+        FOR EACH ROW EXECUTE FUNCTION record_transfer_folders_get_box_keys()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS records_get_folder_keys ON records;
+    CREATE TRIGGER records_get_folder_keys
+        BEFORE INSERT OR UPDATE OF folder_id ON records
+        FOR EACH ROW EXECUTE FUNCTION records_get_folder_keys()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS record_transfer_boxes_keys_changed ON record_transfer_boxes;
+    CREATE TRIGGER record_transfer_boxes_keys_changed
+        AFTER UPDATE ON record_transfer_boxes
+        FOR EACH ROW
+        WHEN (OLD.collection_id IS DISTINCT FROM NEW.collection_id OR OLD.box_number IS DISTINCT FROM NEW.box_number)
+        EXECUTE FUNCTION record_transfer_boxes_keys_changed()
+    ''',
+    '''
+    DROP TRIGGER IF EXISTS record_transfer_folders_keys_changed ON record_transfer_folders;
+    CREATE TRIGGER record_transfer_folders_keys_changed
+        AFTER UPDATE ON record_transfer_folders
+        FOR EACH ROW
+        WHEN (
+            OLD.collection_id IS DISTINCT FROM NEW.collection_id OR
+            OLD.box_number IS DISTINCT FROM NEW.box_number OR
+            OLD.folder_number IS DISTINCT FROM NEW.folder_number
+        )
+        EXECUTE FUNCTION record_transfer_folders_keys_changed()
+    '''
+]
+
+for _statement in BROWSE_KEYS_DDL:
+    sqla.event.listen(
+        BaseModel.metadata,
+        'after_create',
+        sqla.DDL(_statement).execute_if(dialect='postgresql')
+    )
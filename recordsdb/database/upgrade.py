@@ -0,0 +1,224 @@
+"""
+Bring an existing PostgreSQL records database up to date with the models. create_all() (and so create_db.py) only
+creates tables that don't exist yet, so changes to existing tables are made here instead. Each step checks whether it
+is needed first, and all steps run in one transaction, so this is safe to re-run. Triggers and any missing tables are
+created at the end, so run create_db.py afterward only if the lookup tables also need to be synced.
+
+Usage:
+    upgrade.py
+"""
+
+import typing
+import sqlalchemy as sqla
+
+import recordsdb
+from recordsdb import database
+from recordsdb.database import models
+from recordsdb.database.destruction import create_archive_partition
+from recordsdb.database.holdings import refresh_holdings_summary
+
+
+__all__ = [
+    'add_browse_keys',
+    'partition_records',
+    'rebuild_folder_id_index',
+    'upgrade_database'
+]
+
+
+def _get_column_names(conn: sqla.engine.Connection, table_name: str) -> typing.Set[str]:
+    return {c['name'] for c in sqla.inspect(conn).get_columns(table_name)}
+
+
+def add_browse_keys(conn: sqla.engine.Connection) -> bool:
+    """
+    Add the copies of collection_id, box_number, and folder_number to record_transfer_folders and records (see
+    models.BROWSE_KEYS_DDL), fill them in from the boxes and folders, make box and folder numbers required, and add
+    the browse indexes. Folders without a folder number get folder number 1, the same default the import uses
+    :param conn: SQLAlchemy Connection in an open transaction
+    :return: True if anything was changed
+    """
+    folder_columns = _get_column_names(conn, models.RecordTransferFolder.__tablename__)
+    record_columns = _get_column_names(conn, models.Record.__tablename__)
+    if 'box_number' in folder_columns and 'box_number' in record_columns:
+        return False
+
+    n_unnumbered_boxes = conn.execute(sqla.text(
+        'SELECT count(*) FROM record_transfer_boxes WHERE box_number IS NULL'
+    )).scalar()
+    if n_unnumbered_boxes:
+        raise RuntimeError(
+            f'{n_unnumbered_boxes} record transfer box(es) have no box number. Give every box a number and try again'
+        )
+    conn.execute(sqla.text('UPDATE record_transfer_folders SET folder_number = 1 WHERE folder_number IS NULL'))
+
+    if 'box_number' not in folder_columns:
+        conn.execute(sqla.text('''
+            ALTER TABLE record_transfer_folders
+                ADD COLUMN collection_id integer
+                    REFERENCES collections (id) ON UPDATE CASCADE ON DELETE CASCADE,
+                ADD COLUMN box_number integer
+        '''))
+        conn.execute(sqla.text('''
+            UPDATE record_transfer_folders f SET collection_id = b.collection_id, box_number = b.box_number
+            FROM record_transfer_boxes b
+            WHERE b.id = f.box_id
+        '''))
+    if 'box_number' not in record_columns:
+        conn.execute(sqla.text('ALTER TABLE records ADD COLUMN box_number integer, ADD COLUMN folder_number integer'))
+        conn.execute(sqla.text('''
+            UPDATE records r SET box_number = f.box_number, folder_number = f.folder_number
+            FROM record_transfer_folders f
+            WHERE f.id = r.folder_id
+        '''))
+
+    conn.execute(sqla.text('ALTER TABLE record_transfer_boxes ALTER COLUMN box_number SET NOT NULL'))
+    conn.execute(sqla.text('''
+        ALTER TABLE record_transfer_folders
+            ALTER COLUMN folder_number SET NOT NULL,
+            ALTER COLUMN box_number SET NOT NULL
+    '''))
+    conn.execute(sqla.text('''
+        ALTER TABLE records
+            ALTER COLUMN box_number SET NOT NULL,
+            ALTER COLUMN folder_number SET NOT NULL
+    '''))
+
+    for table, index_name in (
+            (models.RecordTransferFolder.__table__, 'ix_record_transfer_folders_collection_box_folder'),
+            (models.Record.__table__, 'ix_records_collection_box_folder')
+        ):
+        index = next(i for i in table.indexes if i.name == index_name)
+        index.create(conn, checkfirst=True)
+
+    return True
+
+
+def _select_destruction_years() -> str:
+    """
+    Get SQL that selects the year each destroyed collection was destroyed. destroyed_collections doesn't store a
+    destruction date, so this is the year its destroyed_collections row (or else its destruction request) was created.
+    If neither has a create_time, the current year is used. Collections with more than one destroyed_collections row
+    get the earliest year
+    :return: SQL of a select of collection_id, destruction_year
+    """
+    return '''
+        SELECT
+            d.collection_id,
+            min(extract(year FROM coalesce(d.create_time, q.create_time, now())))::integer AS destruction_year
+        FROM destroyed_collections d LEFT JOIN destruction_requests q ON q.id = d.destruction_request_id
+        WHERE d.collection_id IS NOT NULL
+        GROUP BY d.collection_id
+    '''
+
+
+def partition_records(conn: sqla.engine.Connection) -> bool:
+    """
+    Convert records to a table partitioned on destruction_year (see models.Record). A table can't be partitioned in
+    place, so the existing table is renamed, the partitioned table and records_current are created, all rows are
+    copied with their ids, and the old table is dropped. Records of collections that were already destroyed go to the
+    archive partition for the year they were destroyed (see _select_destruction_years()) and all others go to
+    records_current. Triggers aren't created until the end of upgrade_database(), so the copy doesn't touch
+    holdings_summary
+    :param conn: SQLAlchemy Connection in an open transaction
+    :return: True if records was converted
+    """
+    relkind = conn.execute(sqla.text("SELECT relkind FROM pg_class WHERE oid = 'records'::regclass")).scalar()
+    if relkind == 'p':
+        return False
+
+    old_table_name = 'records_unpartitioned'
+    conn.execute(sqla.text(f'ALTER TABLE records RENAME TO {old_table_name}'))
+    conn.execute(sqla.text(f'ALTER TABLE {old_table_name} RENAME CONSTRAINT records_pkey TO {old_table_name}_pkey'))
+    # The new table's indexes and id sequence would otherwise collide with the old ones' names
+    for index_name in conn.execute(
+            sqla.text("SELECT indexname FROM pg_indexes WHERE tablename = :table_name AND indexname LIKE 'ix_%'"),
+            {'table_name': old_table_name}
+        ).scalars().all():
+        conn.execute(sqla.text(f'DROP INDEX {index_name}'))
+    sequence_name = conn.execute(
+        sqla.text('SELECT pg_get_serial_sequence(:table_name, :column_name)'),
+        {'table_name': old_table_name, 'column_name': 'id'}
+    ).scalar()
+    if sequence_name:
+        conn.execute(sqla.text(f'ALTER SEQUENCE {sequence_name} RENAME TO {old_table_name}_id_seq'))
+
+    models.Record.__table__.create(conn)
+
+    destruction_years = _select_destruction_years()
+    for destruction_year in conn.execute(
+            sqla.text(f'SELECT DISTINCT destruction_year FROM ({destruction_years}) AS y')
+        ).scalars():
+        create_archive_partition(conn, destruction_year)
+
+    column_names = [
+        c.name for c in models.Record.__table__.c
+        if c.name in _get_column_names(conn, old_table_name) and c.name != 'destruction_year'
+    ]
+    conn.execute(sqla.text(f'''
+        INSERT INTO records ({', '.join(column_names)}, destruction_year)
+        SELECT {', '.join('r.' + c for c in column_names)}, coalesce(y.destruction_year, 0)
+        FROM {old_table_name} r LEFT JOIN ({destruction_years}) AS y ON y.collection_id = r.collection_id
+    '''))
+    conn.execute(sqla.text(
+        "SELECT setval(pg_get_serial_sequence('records', 'id'), coalesce(max(id), 0) + 1, false) FROM records"
+    ))
+    conn.execute(sqla.text(f'DROP TABLE {old_table_name}'))
+
+    return True
+
+
+def rebuild_folder_id_index(conn: sqla.engine.Connection) -> bool:
+    """
+    Replace the ix_records_folder_id index that also included the browsed columns with the plain folder_id index in
+    models.Record. Records aren't browsed by folder anymore, so the included columns only slowed down writes
+    :param conn: SQLAlchemy Connection in an open transaction
+    :return: True if the index was replaced
+    """
+    index = next(i for i in models.Record.__table__.indexes if i.name == 'ix_records_folder_id')
+    index_definition = conn.execute(
+        sqla.text('SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND indexname = :index_name'),
+        {'index_name': index.name}
+    ).scalar()
+    if index_definition and 'INCLUDE' not in index_definition and '(folder_id)' in index_definition:
+        return False
+
+    if index_definition:
+        conn.execute(sqla.text(f'DROP INDEX {index.name}'))
+    index.create(conn)
+
+    return True
+
+
+def upgrade_database(db_engine: sqla.engine.Engine) -> typing.List[str]:
+    """
+    Run all upgrade steps that are needed, create any missing tables, (re)create all triggers, and rebuild
+    holdings_summary so it matches the current trigger definitions
+    :param db_engine: SQLAlchemy Engine of the database to upgrade
+    :return: names of the steps that changed the database
+    """
+    if db_engine.dialect.name != 'postgresql':
+        raise RuntimeError('Upgrading is only supported for PostgreSQL databases')
+
+    # Order matters: the browse keys are added to the old records table so partition_records() copies them
+    steps = [add_browse_keys, partition_records, rebuild_folder_id_index]
+    changed = []
+    with db_engine.begin() as conn:
+        for step in steps:
+            if step(conn):
+                changed.append(step.__name__)
+        models.BaseModel.metadata.create_all(conn)
+        refresh_holdings_summary(conn)
+
+    return changed
+
+
+def main() -> None:
+
+    changed = upgrade_database(database.engine)
+    print('Upgraded: ' + ', '.join(changed) if changed else 'The database is already up to date')
+
+
+if __name__ == '__main__':
+    args = recordsdb.get_docopt_args(__doc__)
+    main(**args)
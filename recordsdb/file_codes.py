@@ -0,0 +1,177 @@
+"""
+In-memory index of NPS file codes (e.g., 1.A.1) for resolving the file code strings people type into box
+inventories and destruction logs. Items are stored in a trie keyed on the dot-separated parts of the item, so exact,
+parent, child, and closest-match lookups all cost O(depth) regardless of how many file codes are in the schedule.
+
+This module doesn't import recordsdb.database, so scripts that only read spreadsheets (e.g., write_di1941.py) can use
+it without a database connection or config file.
+"""
+
+import re
+import typing
+import pandas as pd
+import sqlalchemy as sqla
+from sqlalchemy import orm
+
+
+__all__ = [
+    'FileCodeMatch',
+    'FileCodeIndex',
+    'normalize_nps_item'
+]
+
+
+class FileCodeMatch(typing.NamedTuple):
+    nps_item:           str
+    code:               typing.Optional[int]
+    retention_years:    typing.Optional[int]
+    # 'exact', 'child' (the only file code under the requested item), or 'parent' (closest ancestor of the item)
+    match_type:         str
+
+
+def normalize_nps_item(nps_item: str) -> typing.Tuple[str, ...]:
+    """
+    Split an NPS item into its parts, ignoring case, whitespace, leading zeros, and an "NPS Item" prefix so that
+    variant spellings like "NPS Item 1.a.01" and "1.A.1." resolve to the same key
+    :param nps_item: NPS file code string
+    :return: tuple of normalized parts (e.g., ('1', 'A', '1'))
+    """
+    nps_item = re.sub(r'^\s*(NPS\s+)?Item\s+', '', str(nps_item), flags=re.IGNORECASE)
+    parts = []
+    for part in re.split(r'[.\s]+', nps_item.strip(' .')):
+        if part.isdigit():
+            part = str(int(part))
+        parts.append(part.upper())
+
+    return tuple(p for p in parts if p)
+
+
+class _Node:
+    __slots__ = ('children', 'match')
+
+    def __init__(self):
+        self.children: typing.Dict[str, '_Node'] = {}
+        self.match: typing.Optional[FileCodeMatch] = None
+
+
+class FileCodeIndex:
+    """Trie of NPS items built from the nps_file_codes lookup table or a retention schedule"""
+
+    def __init__(self, file_codes: pd.DataFrame):
+        """
+        :param file_codes: Pandas DataFrame with an nps_item column and, optionally, code and retention_years columns
+        """
+        self._root = _Node()
+        for row in file_codes.to_dict('records'):
+            parts = normalize_nps_item(row['nps_item'])
+            if not parts:
+                continue
+            node = self._root
+            for part in parts:
+                node = node.children.setdefault(part, _Node())
+            code = row.get('code')
+            retention_years = row.get('retention_years')
+            node.match = FileCodeMatch(
+                nps_item='.'.join(parts),
+                code=None if pd.isna(code) else int(code),
+                retention_years=None if pd.isna(retention_years) else int(retention_years),
+                match_type='exact'
+            )
+
+    @classmethod
+    def from_connection(cls, conn: typing.Union[sqla.engine.Connection, orm.Session]) -> 'FileCodeIndex':
+        """
+        Build the index from the nps_file_codes table
+        :param conn: SQLAlchemy Connection or Session
+        """
+        if isinstance(conn, orm.Session):
+            conn = conn.connection()
+        return cls(pd.read_sql('SELECT nps_item, code, retention_years FROM nps_file_codes', conn))
+
+    def _walk(self, parts: typing.Tuple[str, ...]) -> typing.Tuple[_Node, typing.Optional[_Node], int]:
+        """
+        Follow parts down the trie as far as they go
+        :return: deepest node reached, deepest node along the way that has a file code, number of parts matched
+        """
+        node = self._root
+        closest = None
+        depth = 0
+        for part in parts:
+            if part not in node.children:
+                break
+            node = node.children[part]
+            depth += 1
+            if node.match:
+                closest = node
+
+        return node, closest, depth
+
+    def get(self, nps_item: str) -> typing.Optional[FileCodeMatch]:
+        """
+        Exact lookup of an NPS item, allowing for variant spellings
+        :return: FileCodeMatch or None if the item isn't a file code
+        """
+        parts = normalize_nps_item(nps_item)
+        node, _, depth = self._walk(parts)
+        if parts and depth == len(parts):
+            return node.match
+        return None
+
+    def __contains__(self, nps_item: str) -> bool:
+        return self.get(nps_item) is not None
+
+    def parent(self, nps_item: str) -> typing.Optional[FileCodeMatch]:
+        """
+        Find the closest ancestor of an NPS item that is itself a file code
+        :return: FileCodeMatch with match_type 'parent' or None if no ancestor is a file code
+        """
+        parts = normalize_nps_item(nps_item)
+        _, closest, _ = self._walk(parts[:-1])
+        return closest.match._replace(match_type='parent') if closest else None
+
+    def children(self, nps_item: str) -> typing.List[FileCodeMatch]:
+        """
+        Get all file codes under an NPS item (e.g., 1.A.1 and 1.A.2 for 1.A), not including the item itself
+        :return: list of FileCodeMatch with match_type 'child'
+        """
+        parts = normalize_nps_item(nps_item)
+        node, _, depth = self._walk(parts)
+        if depth < len(parts):
+            return []
+
+        matches = []
+        stack = list(node.children.values())
+        while stack:
+            node = stack.pop()
+            if node.match:
+                matches.append(node.match._replace(match_type='child'))
+            stack.extend(node.children.values())
+
+        return sorted(matches, key=lambda m: m.nps_item)
+
+    def resolve(self, nps_item: str) -> FileCodeMatch:
+        """
+        Resolve an NPS item to a single file code. An exact match is returned if there is one. If the item is a
+        parent of exactly one file code, that file code is returned. Otherwise the closest ancestor that is a file
+        code is returned.
+        :param nps_item: NPS file code string
+        :return: FileCodeMatch
+        :raises ValueError: if the item is ambiguous (a parent of several file codes) or nothing matches
+        """
+        parts = normalize_nps_item(nps_item)
+        node, closest, depth = self._walk(parts)
+        if parts and depth == len(parts):
+            if node.match:
+                return node.match
+            children = self.children(nps_item)
+            if len(children) == 1:
+                return children[0]
+            elif children:
+                raise ValueError(
+                    f'NPS Item {nps_item} is ambiguous. It could be any of'
+                    f' {", ".join(c.nps_item for c in children)}'
+                )
+        elif closest:
+            return closest.match._replace(match_type='parent')
+
+        raise ValueError(f'NPS Item {nps_item} not in file codes')
@@ -4,15 +4,19 @@ The SF-135 must be generated by ARCIS from an existing records transfer request.
 using the records_box_inventory_dena_template.xlsx file found at https://github.com/smHooper/recordsdb. If only an
 SF-135 is given, the TRANSFER NUMBER on the PDF must already exist in the records database.
 
+Imports of different transfers can run at the same time. If another import of the same transfer is already running,
+the import is skipped unless --wait is given.
+
 Usage:
-    import_transferred_records.py --box_inventory_path=<str>
-    import_transferred_records.py --sf135_path=<str>
-    import_transferred_records.py --box_inventory_path=<str> --sf135_path=<str>
+    import_transferred_records.py --box_inventory_path=<str> [--wait]
+    import_transferred_records.py --sf135_path=<str> [--wait]
+    import_transferred_records.py --box_inventory_path=<str> --sf135_path=<str> [--wait]
 
 Options:
     -h, --help                      Show this screen.
     -i, --box_inventory_path=<str>  Path to a Records Transfer Box Inventory Excel file
     -s, --sf135_path=<str>          Path to an SF-135 PDF file
+    -w, --wait                      Wait for another import of the same transfer to finish instead of skipping
 """
 
 
@@ -24,9 +28,12 @@ import openpyxl
 import pandas as pd
 from datetime import datetime
 import sqlalchemy as sqla
+from sqlalchemy import orm
 
 import recordsdb_helper
-from recordsdb.database import engine, models, SessionMaker
+from recordsdb.database import engine, holdings, models, SessionMaker
+from recordsdb.file_codes import FileCodeIndex
+from recordsdb.database.locks import acquire_transfer_lock, insert_on_conflict_do_nothing
 import recordsdb
 
 
@@ -73,6 +80,28 @@ COLLECTION_FIELD_MAP = {
     'G9': 'tags',
 }
 
+# Formats to try, in order, for date values stored as text. Box inventory dates are mm/yyyy, SF-135 dates are
+#   mm/dd/yyyy, and anything already normalized is ISO
+DATE_FORMATS = ('%m/%Y', '%m/%d/%Y', '%Y-%m-%d')
+
+# Longest value shown for a row in the validation error report. Longer values are cut off with '...'
+MAX_ERROR_VALUE_LENGTH = 50
+
+# Outcomes of main()
+IMPORT_IMPORTED = 'imported'
+IMPORT_UPDATED = 'updated'
+IMPORT_ALREADY_IMPORTED = 'already imported'
+IMPORT_IN_PROGRESS = 'in progress'
+
+IMPORT_MESSAGES = {
+    IMPORT_IMPORTED: 'The Box Inventory was imported.',
+    IMPORT_UPDATED: 'The SF-135 data were added to the existing record series.',
+    IMPORT_ALREADY_IMPORTED: 'The transfer number already exists in the database, so nothing was imported. You can\'t'
+                             ' import a Box Inventory for a record series that was already imported.',
+    IMPORT_IN_PROGRESS: 'Another import of this transfer number is in progress, so nothing was imported. Use --wait'
+                        ' to wait for it to finish instead.'
+}
+
 
 def find_cell_x_bounds(cell_bounds: pd.DataFrame, search_rect: fitz.Rect) -> tuple:
     """
@@ -227,10 +256,17 @@ def read_sf135(path: str) -> dict:
     return field_values
 
 
-def read_box_inventory(excel_path: str, conn: sqla.engine.Connection) -> typing.Tuple[dict, pd.DataFrame]:
+def read_box_inventory(
+        excel_path: str,
+        conn: sqla.engine.Connection,
+        file_code_index: typing.Optional[FileCodeIndex]=None
+) -> typing.Tuple[dict, pd.DataFrame]:
     """
     Extract data from a Box Inventory Excel file
     :param excel_path:
+    :param conn: SQLAlchemy Connection or Session used to look up codes
+    :param file_code_index: FileCodeIndex to resolve the NPS file code with. If not given, one is built from the
+        nps_file_codes table
     :return: dictionary of field/value pairs for single row of collections table, Pandas Dataframe for multiple Records table
     """
     # Get inventory table
@@ -246,28 +282,38 @@ def read_box_inventory(excel_path: str, conn: sqla.engine.Connection) -> typing.
     data = pd.DataFrame(table_contents[1:], columns=table_contents[0])\
         .dropna(how='all')\
         .rename(columns=EXCEL_COLUMN_MAP)
+    # Index rows by their row number in the worksheet so validation errors point to the right row
+    data.index += y1 + 1
 
     collection_fields = {field_name: sheet[cell_address].value for cell_address, field_name in COLLECTION_FIELD_MAP.items()}
 
     # Replace names with codes for fields that reference lookup tables
     for field_name in collection_fields:
-        if field_name.endswith('code'):
+        if field_name.endswith('code') and field_name != 'nps_file_code':
             field_value = collection_fields[field_name]
             lookup_values = pd.read_sql(f'''SELECT name, code FROM {field_name}s''', conn)\
                 .set_index('name')\
                 .squeeze(axis=1)
             if field_value in lookup_values.index:
-                collection_fields[field_name] = lookup_values[field_value]
+                collection_fields[field_name] = int(lookup_values[field_value])
 
-    nps_item = re.findall(r'^NPS Item [\d.a-zA-Z]+', collection_fields['nps_file_code'])[0].replace('NPS Item ', '')
-    file_codes = pd.read_sql('SELECT nps_item, code FROM nps_file_codes', conn) \
-        .set_index('nps_item') \
-        .squeeze(axis=1)
-
-    if nps_item in file_codes:
-        collection_fields['nps_file_code'] = file_codes[nps_item]
-    else:
-        raise ValueError(f'NPS Item {nps_item} not in file codes')
+    # The file code cell is a dropdown of "NPS Item x.y.z - name", but it's sometimes typed in by hand, so allow
+    #   variant spellings (e.g., 1.a.01). The file code determines the retention period, so anything other than an
+    #   exact match is rejected rather than silently replaced with a parent or child item
+    nps_item_match = re.search(
+        r'(?:NPS\s+)?Item\s+([\d.a-zA-Z]+)', str(collection_fields['nps_file_code']), re.IGNORECASE
+    )
+    nps_item = nps_item_match.group(1) if nps_item_match else str(collection_fields['nps_file_code'])
+    if file_code_index is None:
+        file_code_index = FileCodeIndex.from_connection(conn)
+    file_code_match = file_code_index.resolve(nps_item)
+    if file_code_match.match_type != 'exact':
+        raise ValueError(
+            f'NPS Item {nps_item} in the Box Inventory is not a file code. The closest file code is'
+            f' {file_code_match.nps_item} ({file_code_match.match_type} item). Correct the file code in the Box'
+            f' Inventory and try again'
+        )
+    collection_fields['nps_file_code'] = file_code_match.code
 
     # attachment directory is stored in the config as a path relative to the package level directory
     attachments_dir = os.path.join(os.path.dirname(os.path.abspath(recordsdb.__file__)), recordsdb.config['attachments_dir'])
@@ -277,42 +323,242 @@ def read_box_inventory(excel_path: str, conn: sqla.engine.Connection) -> typing.
     return collection_fields, data
 
 
-def validate_transfer_number(transfer_number: str) -> typing.Optional[sqla.engine.ScalarResult]:
+def parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Vectorized date parsing for a column of mixed Excel date cells and text dates. Values that are already dates are
+    used as-is and text values are parsed with each of DATE_FORMATS in turn, only trying the next format on values
+    that haven't been parsed yet
+    :param values: Pandas Series of raw date values
+    :return: Pandas Series of datetime64 values with NaT wherever a value is missing or couldn't be parsed
+    """
+    is_date = values.map(lambda v: isinstance(v, datetime))
+    parsed = pd.to_datetime(values.where(is_date), errors='coerce')
+    text = values.where(~is_date & values.notna()).astype('string').str.strip()
+    for date_format in DATE_FORMATS:
+        unparsed = parsed.isna() & text.notna()
+        if not unparsed.any():
+            break
+        parsed.loc[unparsed] = pd.to_datetime(text.loc[unparsed], format=date_format, errors='coerce', cache=True)
+
+    return parsed
+
+
+def _truncate_value(value: typing.Any) -> typing.Any:
+    if isinstance(value, str) and len(value) > MAX_ERROR_VALUE_LENGTH:
+        return value[:MAX_ERROR_VALUE_LENGTH - 3] + '...'
+    return value
+
+
+def validate_records_data(data: pd.DataFrame) -> typing.Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Check all box inventory rows at once before anything is written to the database. Box numbers must be positive
+    integers, folder numbers must be positive integers (blank folders default to 1), start and end dates must be
+    valid with start <= end <= cut-off, and file titles must fit in the records.file_title column. Dates are
+    compared by month because box inventory dates are mm/yyyy, which are parsed as the first of the month
+    :param data: Pandas DataFrame of records returned by read_box_inventory()
+    :return: Pandas DataFrame of records with normalized numbers and dates, Pandas DataFrame of errors with one row
+        per problem (row, field, value, message)
+    """
+    data = data.copy()
+    errors = []
+
+    def add_errors(is_invalid: pd.Series, field_name: str, message: str) -> None:
+        invalid = data.loc[is_invalid.fillna(False).astype(bool)]
+        errors.extend(
+            {'row': i, 'field': field_name, 'value': _truncate_value(v), 'message': message}
+            for i, v in invalid[field_name].items()
+        )
+
+    for field_name in ('box_number', 'folder_number', 'file_title', 'start_date', 'end_date', 'cutoff_date'):
+        if field_name not in data:
+            data[field_name] = None
+
+    # Box and folder numbers
+    data['folder_number'] = data.folder_number.where(data.folder_number.notna(), 1)
+    for field_name in ('box_number', 'folder_number'):
+        numbers = pd.to_numeric(data[field_name], errors='coerce')
+        add_errors(data[field_name].isna(), field_name, 'value is required')
+        add_errors(
+            data[field_name].notna() & (numbers.isna() | (numbers % 1 != 0) | (numbers < 1)),
+            field_name,
+            'must be a positive whole number'
+        )
+        data[field_name] = numbers.where(numbers % 1 == 0).astype('Int64')
+
+    # File titles
+    max_title_length = models.Record.__table__.c.file_title.type.length
+    titles = data.file_title.astype('string').str.strip()
+    add_errors(titles.isna() | (titles == ''), 'file_title', 'value is required')
+    add_errors(titles.str.len() > max_title_length, 'file_title', f'must be {max_title_length} characters or less')
+    data['file_title'] = titles
+
+    # Dates
+    dates = {}
+    for field_name in ('start_date', 'end_date', 'cutoff_date'):
+        dates[field_name] = parse_dates(data[field_name])
+        if field_name != 'cutoff_date':
+            add_errors(data[field_name].isna(), field_name, 'value is required')
+        add_errors(
+            data[field_name].notna() & dates[field_name].isna(),
+            field_name,
+            'date format not understood (expected mm/yyyy)'
+        )
+    months = {field_name: parsed.dt.to_period('M') for field_name, parsed in dates.items()}
+    add_errors(months['start_date'] > months['end_date'], 'start_date', 'must not be after the end date')
+    add_errors(months['end_date'] > months['cutoff_date'], 'end_date', 'must not be after the cut-off date')
+    for field_name, parsed in dates.items():
+        data[field_name] = parsed.dt.date
+
+    errors = pd.DataFrame(errors, columns=['row', 'field', 'value', 'message'])\
+        .sort_values(['row', 'field'], kind='stable')\
+        .reset_index(drop=True)
+
+    return data, errors
+
+
+def get_collection_id(session: orm.Session, transfer_number: str) -> typing.Optional[int]:
+    """
+    Get the id of the collection with an ARCIS transfer number
+    :param session: SQLAlchemy Session
+    :param transfer_number: ARCIS transfer number
+    :return: collection id or None if the transfer number isn't in the database
+    """
+    return session.scalar(
+        sqla.select(models.Collection.id).where(models.Collection.arcis_transfer_number == transfer_number)
+    )
+
+
+def validate_transfer_number(transfer_number: str) -> typing.Optional[int]:
     """
     Helper method to ensure the transfer_number doesn't already exist in the database. If it does, that means the data
-    were already imported
+    were already imported. This is only a quick check to skip work early: another import could still insert the same
+    transfer number afterward, so main() checks again once it holds the transfer lock and relies on ON CONFLICT when it
+    actually inserts
     :param transfer_number:
-    :return: None
+    :return: id of the existing collection or None
     """
-    with SessionMaker.begin() as conn:
-        statement = sqla.select(models.Collection).where(models.Collection.arcis_transfer_number == transfer_number)
-        return conn.scalar(statement)
+    with SessionMaker.begin() as session:
+        return get_collection_id(session, transfer_number)
 
 
-def main(box_inventory_path: str='', sf135_path: str=''):
+def insert_collection(session: orm.Session, inventory_data: dict, records_data: pd.DataFrame) -> typing.Optional[int]:
+    """
+    Insert a collection with its tags, boxes, folders, and records. The collection is inserted with ON CONFLICT DO
+    NOTHING on arcis_transfer_number, so if another import already added the transfer nothing is written
+    :param session: SQLAlchemy Session in an open transaction
+    :param inventory_data: dictionary of collection field values
+    :param records_data: Pandas DataFrame of validated records (see validate_records_data())
+    :return: the new collection's id or None if the transfer number already exists
+    """
+    collection_columns = models.Collection.__table__.c
+    collection_values = {k: v for k, v in inventory_data.items() if k in collection_columns and k != 'id'}
+    collection_id = session.execute(
+        insert_on_conflict_do_nothing(session, models.Collection.__table__)
+            .values(**collection_values)
+            .returning(models.Collection.id)
+    ).scalar()
+    if collection_id is None:
+        return None
+
+    # Tags are shared between collections, so add any that don't exist yet and then link them all
+    tags = [t.strip() for t in str(inventory_data.get('tags') or '').split(',') if t.strip()]
+    if tags:
+        session.execute(insert_on_conflict_do_nothing(session, models.Tag.__table__), [{'tag_text': t} for t in tags])
+        tag_ids = session.scalars(sqla.select(models.Tag.id).where(models.Tag.tag_text.in_(tags))).all()
+        session.execute(
+            sqla.insert(models.CollectionTag),
+            [{'collection_id': collection_id, 'tag_id': tag_id} for tag_id in tag_ids]
+        )
+
+    if not len(records_data):
+        return collection_id
+
+    # Boxes, then folders, then records, each as a single multi-row insert. Folders and records also get copies of
+    #   their box and folder numbers (see models.BROWSE_KEYS_DDL)
+    box_numbers = records_data.box_number.drop_duplicates()
+    session.execute(
+        sqla.insert(models.RecordTransferBox),
+        [{'collection_id': collection_id, 'box_number': int(n)} for n in box_numbers]
+    )
+    box_ids = dict(session.execute(
+        sqla.select(models.RecordTransferBox.box_number, models.RecordTransferBox.id)
+            .where(models.RecordTransferBox.collection_id == collection_id)
+    ).all())
+
+    folders = records_data[['box_number', 'folder_number']].drop_duplicates()
+    session.execute(
+        sqla.insert(models.RecordTransferFolder),
+        [
+            {'box_id': box_ids[b], 'collection_id': collection_id, 'box_number': int(b), 'folder_number': int(f)}
+            for b, f in folders.itertuples(index=False)
+        ]
+    )
+    folder_ids = {
+        (box_number, folder_number): folder_id
+        for box_number, folder_number, folder_id in session.execute(
+            sqla.select(
+                    models.RecordTransferBox.box_number,
+                    models.RecordTransferFolder.folder_number,
+                    models.RecordTransferFolder.id
+                )
+                .join(models.RecordTransferBox, models.RecordTransferBox.id == models.RecordTransferFolder.box_id)
+                .where(models.RecordTransferBox.collection_id == collection_id)
+        )
+    }
+
+    record_columns = [
+        c for c in ('file_title', 'start_date', 'end_date', 'cutoff_date', 'description') if c in records_data
+    ]
+    records = records_data[record_columns].astype(object).where(records_data[record_columns].notna(), None)
+    records['collection_id'] = collection_id
+    records['box_number'] = records_data.box_number.astype(int).to_list()
+    records['folder_number'] = records_data.folder_number.astype(int).to_list()
+    records['folder_id'] = [
+        folder_ids[(b, f)] for b, f in zip(records.box_number, records.folder_number)
+    ]
+    session.execute(sqla.insert(models.Record), records.to_dict('records'))
+
+    return collection_id
+
+
+def main(box_inventory_path: str='', sf135_path: str='', wait: bool=False) -> str:
+    """
+    Import a box inventory and/or SF-135. All reading and validation happen before the import transaction starts.
+    The transaction takes an advisory lock on the transfer number, so many imports can run at once and only imports
+    of the same transfer wait on (or skip) each other. Imports also don't wait on each other for holdings_summary rows:
+    the summary triggers only append to holdings_summary_deltas, which are added to holdings_summary after the import
+    commits (see holdings.compact_holdings_summary()).
+    :return: one of the IMPORT_* outcomes
+    """
 
-    with SessionMaker.begin() as conn:
+    with engine.connect() as conn:
         inventory_data = {}
         if box_inventory_path:
             inventory_data, records_data = read_box_inventory(box_inventory_path, conn)
 
+    # If a box inventory was given, make sure the transfer number doesn't exist yet in the database before doing any
+    #   more work
+    if inventory_data:
+        transfer_number = inventory_data['arcis_transfer_number']
+        if transfer_number and validate_transfer_number(transfer_number) is not None:
+            return IMPORT_ALREADY_IMPORTED
+
+        # Check every row of the inventory before touching the database so a bad inventory fails all at once
+        records_data, inventory_errors = validate_records_data(records_data)
+        if len(inventory_errors):
+            raise ValueError(
+                f'The Box Inventory has {len(inventory_errors)} problem(s):\n'
+                + inventory_errors.to_string(index=False)
+            )
+
     sf135_data = {}
     if sf135_path:
          sf135_data = read_sf135(sf135_path)
 
-    # If a box inventory was given, make sure the transfer number doesn't exist yet in the database because
-    if inventory_data:
-        # make sure the transfer number doesn't already exist in the database
-        transfer_number = inventory_data['arcis_transfer_number']
-        if transfer_number and validate_transfer_number(transfer_number):
-            raise RuntimeError(
-                f'The transfer number "{transfer_number}" already exists in the database. You can\'t import a Box'
-                f' Inventory for a record series that was already imported.'
-            )
     # If only the SF-135 was given, the collection has to already be in the database, so verify that it does
-    elif sf135_data:
+    if sf135_data and not inventory_data:
         transfer_number = sf135_data['arcis_transfer_number']
-        if not validate_transfer_number(transfer_number):
+        if validate_transfer_number(transfer_number) is None:
             raise RuntimeError(
                 f'The transfer number "{transfer_number}" does not exist in the database. You can only add data from an'
                 f' SF-135 if the record series is already in the database or you also import a Box Inventory at the'
@@ -332,27 +578,55 @@ def main(box_inventory_path: str='', sf135_path: str=''):
     # Combine the data
     inventory_data |= sf135_data
 
-    # Convert any date fields to ISO format
-    for key, value in inventory_data.items():
-        if key.endswith('_date'):
-            try:
-                inventory_data[key] = datetime.strptime(value, '%m/%d/%Y').strftime('%Y-%m-%d')
-            except:
-                raise ValueError(f'Date format of field {key} not understood: {value}')
+    # Convert any date fields to dates
+    date_values = pd.Series(
+        {k: v for k, v in inventory_data.items() if k.endswith('_date') and v is not None},
+        dtype=object
+    )
+    parsed_dates = parse_dates(date_values)
+    if parsed_dates.isna().any():
+        bad_dates = ', '.join(f'{k} ({date_values[k]})' for k in parsed_dates.loc[parsed_dates.isna()].index)
+        raise ValueError(f'Date format of field(s) not understood: {bad_dates}')
+    inventory_data |= parsed_dates.dt.date.to_dict()
+    # The SF-135 gives volume as text
+    if inventory_data.get('volume_cu_ft') is not None:
+        inventory_data['volume_cu_ft'] = int(round(float(inventory_data['volume_cu_ft'])))
 
     with SessionMaker.begin() as session:
+        if transfer_number and not acquire_transfer_lock(session, transfer_number, wait=wait):
+            return IMPORT_IN_PROGRESS
+
         if box_inventory_path:
-            #insert inventory_data to collections
-            new_collection = models.Collection(**inventory_data)
-            session.flush() # should add id to new_collection
-            # insert boxes returning id
-            # insert folders returning id
-            #records_data.to_sql('records', session, index=False, if_exists='append')
+            # Another import could have committed the transfer between the check above and getting the lock
+            if transfer_number and get_collection_id(session, transfer_number) is not None:
+                return IMPORT_ALREADY_IMPORTED
+            if insert_collection(session, inventory_data, records_data) is None:
+                return IMPORT_ALREADY_IMPORTED
+            outcome = IMPORT_IMPORTED
+        else:
+            # SF-135 only: fill in the transfer fields of the existing collection
+            collection_columns = models.Collection.__table__.c
+            sf135_values = {
+                k: v for k, v in inventory_data.items()
+                if k in collection_columns and k not in ('id', 'arcis_transfer_number')
+            }
+            updated = session.execute(
+                sqla.update(models.Collection)
+                    .where(models.Collection.arcis_transfer_number == transfer_number)
+                    .values(**sf135_values)
+            )
+            if not updated.rowcount:
+                raise RuntimeError(f'The transfer number "{transfer_number}" does not exist in the database')
+            outcome = IMPORT_UPDATED
 
-if __name__ == '__main__':
-    args = recordsdb.get_docopt_args(__doc__)
-    main(**args)
+    # The triggers only appended this import's holdings changes to holdings_summary_deltas. Add them to
+    #   holdings_summary in a short transaction of its own so the summary rows are only locked briefly
+    with engine.begin() as conn:
+        holdings.compact_holdings_summary(conn)
 
+    return outcome
 
-    
-    
\ No newline at end of file
+if __name__ == '__main__':
+    args = recordsdb.get_docopt_args(__doc__)
+    outcome = main(**args)
+    print(IMPORT_MESSAGES[outcome])
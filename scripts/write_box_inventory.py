@@ -0,0 +1,211 @@
+"""
+Write Records Transfer Box Inventory Excel files for collections already in the records database. Each inventory is
+filled in from the records_box_inventory_dena_template.xlsx template in the same layout import_transferred_records.py
+reads, so a generated inventory can be imported again. All data are queried up front and the workbooks are written
+in parallel by a pool of worker processes.
+
+Usage:
+    write_box_inventory.py --template_path=<str> --output_dir=<str> --collection_ids=<str> [--workers=<int>]
+
+Options:
+    -h, --help                  Show this screen.
+    -t, --template_path=<str>   Path to the blank box inventory template
+    -o, --output_dir=<str>      Directory to write the box inventories to
+    -c, --collection_ids=<str>  Comma-separated list of collection IDs to write box inventories for
+    -w, --workers=<int>         Number of worker processes. Defaults to the number of CPUs
+"""
+
+import os
+import re
+import typing
+import openpyxl
+import pandas as pd
+import sqlalchemy as sqla
+from sqlalchemy import orm
+from concurrent.futures import ProcessPoolExecutor
+
+import recordsdb_helper
+from recordsdb.database import models, SessionMaker
+from import_transferred_records import COLLECTION_FIELD_MAP, EXCEL_COLUMN_MAP
+import recordsdb
+
+
+TABLE_NAME = 'box_inventory_data'
+# Format dates the way people fill in the template
+RECORD_DATE_FORMAT = '%m/%Y'
+
+
+def query_inventory_data(
+        conn: typing.Union[sqla.engine.Connection, orm.Session],
+        collection_ids: typing.Sequence[int]
+) -> typing.Dict[int, typing.Tuple[dict, pd.DataFrame]]:
+    """
+    Get the header fields and records of each collection's box inventory with one query per table, rather than one
+    per collection
+    :param conn: SQLAlchemy Connection or Session
+    :param collection_ids: IDs of collections to get data for
+    :return: dictionary of collection_id, (dictionary of header field values, Pandas DataFrame of records)
+    """
+    if isinstance(conn, orm.Session):
+        conn = conn.connection()
+
+    collections = pd.read_sql(
+        sqla.select(
+                models.Collection.id,
+                models.Collection.collection_name,
+                models.Collection.description,
+                models.Collection.prepared_by,
+                models.Collection.prepared_date,
+                models.Collection.arcis_transfer_number,
+                # Header cells show names (and the NPS Item for file codes), which the reader converts to codes
+                (sqla.literal('NPS Item ') + models.NPSFileCode.nps_item + ' - ' + models.NPSFileCode.name)
+                    .label('nps_file_code'),
+                models.TransferLocationCode.name.label('transfer_location_code'),
+                models.ParkDivisionCode.name.label('park_division_code'),
+                models.ProgramAreaCode.name.label('program_area_code')
+            )
+            .outerjoin(models.NPSFileCode, models.NPSFileCode.code == models.Collection.nps_file_code)
+            .outerjoin(
+                models.TransferLocationCode,
+                models.TransferLocationCode.code == models.Collection.transfer_location_code
+            )
+            .outerjoin(models.ProgramAreaCode, models.ProgramAreaCode.code == models.Collection.program_area_code)
+            .outerjoin(
+                models.ParkDivisionCode,
+                models.ParkDivisionCode.code == models.ProgramAreaCode.park_division_code
+            )
+            .where(models.Collection.id.in_(collection_ids)),
+        conn
+    )
+
+    tags = pd.read_sql(
+        sqla.select(models.CollectionTag.collection_id, models.Tag.tag_text)
+            .join(models.Tag, models.Tag.id == models.CollectionTag.tag_id)
+            .where(models.CollectionTag.collection_id.in_(collection_ids))
+            .order_by(models.Tag.tag_text),
+        conn
+    )
+    collections['tags'] = collections.id\
+        .map(tags.groupby('collection_id').tag_text.agg(', '.join))\
+        .astype(object)
+    collections = collections.astype(object).where(collections.notna(), None)
+
+    records = pd.read_sql(
+        sqla.select(
+                models.RecordTransferBox.collection_id,
+                models.RecordTransferBox.box_number,
+                models.RecordTransferFolder.folder_number,
+                models.Record.file_title,
+                models.Record.start_date,
+                models.Record.end_date,
+                models.Record.cutoff_date,
+                models.Record.description
+            )
+            .join(models.RecordTransferFolder, models.RecordTransferFolder.id == models.Record.folder_id)
+            .join(models.RecordTransferBox, models.RecordTransferBox.id == models.RecordTransferFolder.box_id)
+            .where(models.RecordTransferBox.collection_id.in_(collection_ids))
+            .where(models.Record.destruction_year == 0)
+            .order_by(
+                models.RecordTransferBox.collection_id,
+                models.RecordTransferBox.box_number,
+                models.RecordTransferFolder.folder_number,
+                models.Record.id
+            ),
+        conn
+    )
+    for field_name in ('start_date', 'end_date', 'cutoff_date'):
+        records[field_name] = pd.to_datetime(records[field_name]).dt.strftime(RECORD_DATE_FORMAT)
+    records = records.astype(object).where(records.notna(), None)
+
+    inventory_data = {}
+    records_by_collection = dict(list(records.groupby('collection_id')))
+    for collection in collections.to_dict('records'):
+        collection_records = records_by_collection.get(collection['id'], records.iloc[:0])
+        inventory_data[collection['id']] = (collection, collection_records.drop(columns='collection_id'))
+
+    return inventory_data
+
+
+def write_box_inventory(template_path: str, output_path: str, collection_fields: dict, data: pd.DataFrame) -> str:
+    """
+    Fill in a copy of the box inventory template. This is the reverse of
+    import_transferred_records.read_box_inventory(): header fields go in the cells of COLLECTION_FIELD_MAP and
+    records go in the rows of the box_inventory_data table, which is resized to fit them
+    :param template_path: Path to the blank box inventory template
+    :param output_path: Path of the Excel file to write
+    :param collection_fields: dictionary of header field values (see query_inventory_data())
+    :param data: Pandas DataFrame of records with columns named like the values of EXCEL_COLUMN_MAP
+    :return: output_path
+    """
+    workbook = openpyxl.load_workbook(template_path)
+    sheet = workbook[workbook.sheetnames[0]]
+    table = sheet.tables[TABLE_NAME]
+
+    for cell_address, field_name in COLLECTION_FIELD_MAP.items():
+        sheet[cell_address] = collection_fields.get(field_name)
+
+    # Data extends beyond table bounds by one column (see read_box_inventory())
+    x1, y1, x2, y2 = openpyxl.utils.range_boundaries(table.ref)
+    column_indices = {
+        EXCEL_COLUMN_MAP[sheet.cell(y1, column).value]: column
+        for column in range(x1, x2 + 2)
+        if sheet.cell(y1, column).value in EXCEL_COLUMN_MAP
+    }
+
+    # Clear any example rows in the template
+    for row in sheet.iter_rows(min_row=y1 + 1, max_row=y2, min_col=x1, max_col=x2 + 1):
+        for cell in row:
+            cell.value = None
+
+    field_names = [f for f in data.columns if f in column_indices]
+    for row_index, values in enumerate(data[field_names].itertuples(index=False, name=None), start=y1 + 1):
+        for field_name, value in zip(field_names, values):
+            sheet.cell(row_index, column_indices[field_name], value)
+
+    # A table needs at least one data row
+    table.ref = f'{openpyxl.utils.get_column_letter(x1)}{y1}:' \
+                f'{openpyxl.utils.get_column_letter(x2)}{y1 + max(len(data), 1)}'
+    if table.autoFilter:
+        table.autoFilter.ref = table.ref
+
+    workbook.save(output_path)
+
+    return output_path
+
+
+def _write_box_inventory_args(args: tuple) -> str:
+    return write_box_inventory(*args)
+
+
+def get_output_path(output_dir: str, collection_fields: dict) -> str:
+    name = collection_fields['arcis_transfer_number'] or f'collection_{collection_fields["id"]}'
+    return os.path.join(output_dir, 'box_inventory_' + re.sub(r'[^\w.-]', '_', str(name)) + '.xlsx')
+
+
+def main(template_path: str, output_dir: str, collection_ids: typing.Union[str, int], workers: int=None) -> list:
+
+    collection_ids = [int(i) for i in str(collection_ids).split(',') if i.strip()]
+
+    with SessionMaker() as session:
+        inventory_data = query_inventory_data(session, collection_ids)
+
+    missing_ids = set(collection_ids) - set(inventory_data)
+    if missing_ids:
+        raise ValueError(f'Collection ID(s) not found: {", ".join(str(i) for i in sorted(missing_ids))}')
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_args = [
+        (template_path, get_output_path(output_dir, collection_fields), collection_fields, data)
+        for collection_fields, data in inventory_data.values()
+    ]
+    # Writing one workbook is quick, so don't bother starting processes for just one
+    if len(write_args) == 1:
+        return [_write_box_inventory_args(write_args[0])]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_write_box_inventory_args, write_args))
+
+
+if __name__ == '__main__':
+    args = recordsdb.get_docopt_args(__doc__)
+    main(**args)
@@ -11,10 +11,49 @@ import openpyxl
 import PyPDF2
 import pandas as pd
 
+from recordsdb.file_codes import FileCodeIndex, normalize_nps_item
+
 PDF_ROW_COUNT = 15
 TEMPLATE_PDF_PATH = r"\\inpdenafiles02\parkwide\Records Management\Temporary Records\Documentation-of-Temporary-Records-Destruction--DI-1941-BLANK.pdf"
 
 
+def resolve_file_codes(entry_codes: pd.Series, crosswalk_codes: pd.Series) -> pd.Series:
+    """
+    Match file codes typed into the entry log to the file codes in the NPS-DRS crosswalk so that variant spellings
+    (e.g., 1.a.1) still pick up the right authority. The authority printed on the form depends on the file code, so
+    anything other than an exact match (e.g., a typo that only matches a parent or child item) is rejected
+    :param entry_codes: File Code column of the entry log
+    :param crosswalk_codes: File Code column of the NPS-DRS crosswalk
+    :return: Pandas Series of file codes as spelled in the crosswalk
+    :raises ValueError: listing every entry log file code that isn't in the crosswalk
+    """
+    file_code_index = FileCodeIndex(pd.DataFrame({'nps_item': crosswalk_codes}))
+    crosswalk_spellings = {'.'.join(normalize_nps_item(code)): code for code in crosswalk_codes}
+
+    problems = []
+    def resolve(code):
+        try:
+            file_code_match = file_code_index.resolve(code)
+        except ValueError as error:
+            problems.append(str(error))
+            return code
+        if file_code_match.match_type != 'exact':
+            problems.append(
+                f'NPS Item {code} not in file codes. The closest file code is'
+                f' {crosswalk_spellings[file_code_match.nps_item]} ({file_code_match.match_type} item)'
+            )
+        return crosswalk_spellings[file_code_match.nps_item]
+
+    resolved_codes = entry_codes.map(resolve)
+    if problems:
+        raise ValueError(
+            f'{len(problems)} File Code(s) in the Entry Log are not in the NPS-DRS Crosswalk. Correct them and try'
+            f' again:\n' + '\n'.join(problems)
+        )
+
+    return resolved_codes
+
+
 def write_di1941(excel_path, output_path):
 
     reader = PyPDF2.PdfReader(TEMPLATE_PDF_PATH)
@@ -39,6 +78,7 @@ def write_di1941(excel_path, output_path):
     entry_log = pd.read_excel(workbook, sheet_name='Entry Log', usecols='A:I', engine='openpyxl', skiprows=7)\
         .dropna(subset=['File Code', 'Records Series Name/Description'], how='any')
     file_codes = pd.read_excel(workbook, sheet_name='NPS-DRS Crosswalk', engine='openpyxl').dropna()
+    entry_log['File Code'] = resolve_file_codes(entry_log['File Code'], file_codes['File Code'])
     entry_log['date_range'] = \
         entry_log['Start Date (mm/yyyy)'].dt.strftime('%m/%Y') + ' - ' +\
         entry_log['End Date (mm/yyyy)'].dt.strftime('%m/%Y')
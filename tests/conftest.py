@@ -0,0 +1,121 @@
+"""
+Shared fixtures. Tests run against the in-memory SQLite database that recordsdb.database creates for a "sqlite://"
+db_url (see create_db_engine()), so no database server or config/config.json is needed. The database lives for the
+whole test session, and every test starts with empty data tables and seeded lookup tables.
+"""
+
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime
+import pandas as pd
+import pytest
+import openpyxl
+from openpyxl.worksheet.table import Table
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, 'scripts')]
+
+RETENTION_SCHEDULE_CSV = os.path.join(TESTS_DIR, 'data', 'retention_schedule.csv')
+
+# Must be set before recordsdb is imported
+_config_dir = tempfile.mkdtemp(prefix='recordsdb_tests_')
+_config_json = os.path.join(_config_dir, 'config.json')
+with open(_config_json, 'w') as f:
+    json.dump(
+        {'db_url': 'sqlite://', 'retention_schedule_csv': RETENTION_SCHEDULE_CSV, 'attachments_dir': _config_dir},
+        f
+    )
+os.environ['RECORDSDB_CONFIG'] = _config_json
+
+from recordsdb.database import engine, models
+from recordsdb.database.cache import query_cache
+import import_transferred_records
+import write_box_inventory
+
+
+LOOKUP_TABLES = {
+    models.NPSFileCode.__tablename__,
+    models.ParkDivisionCode.__tablename__,
+    models.ProgramAreaCode.__tablename__,
+    models.TransferLocationCode.__tablename__
+}
+
+BOX_INVENTORY_HEADER_ROW = 11
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    yield
+    with engine.begin() as conn:
+        for table in reversed(models.BaseModel.metadata.sorted_tables):
+            if table.name not in LOOKUP_TABLES:
+                conn.execute(table.delete())
+    query_cache.invalidate()
+
+
+@pytest.fixture(scope='session')
+def box_inventory_template(tmp_path_factory) -> str:
+    """Blank box inventory laid out like records_box_inventory_dena_template.xlsx"""
+    path = str(tmp_path_factory.mktemp('template') / 'box_inventory_template.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    # The last column is outside of the table, like in the real template (see read_box_inventory())
+    for column, header in enumerate(import_transferred_records.EXCEL_COLUMN_MAP, start=1):
+        sheet.cell(BOX_INVENTORY_HEADER_ROW, column, header)
+    last_column = openpyxl.utils.get_column_letter(len(import_transferred_records.EXCEL_COLUMN_MAP) - 1)
+    sheet.add_table(Table(
+        displayName='box_inventory_data',
+        ref=f'A{BOX_INVENTORY_HEADER_ROW}:{last_column}{BOX_INVENTORY_HEADER_ROW + 1}'
+    ))
+    workbook.save(path)
+
+    return path
+
+
+@pytest.fixture
+def make_box_inventory(box_inventory_template, tmp_path):
+    """Get a function that writes a box inventory from header field values and a list of record dictionaries"""
+    def _make_box_inventory(transfer_number: str, records: list, **collection_fields) -> str:
+        collection_fields = {
+            'collection_name': f'Collection {transfer_number}',
+            'nps_file_code': 'NPS Item 1.B.2 - Budget files',
+            'description': 'Test collection',
+            'transfer_location_code': 'Federal Records Center',
+            'prepared_by': 'tester',
+            'prepared_date': datetime(2024, 5, 1),
+            'arcis_transfer_number': transfer_number,
+            'park_division_code': 'Administration',
+            'program_area_code': 'Budget',
+            'tags': 'budget, test'
+        } | collection_fields
+        path = str(tmp_path / f'box_inventory_{transfer_number}.xlsx')
+        return write_box_inventory.write_box_inventory(
+            box_inventory_template, path, collection_fields, pd.DataFrame(records)
+        )
+
+    return _make_box_inventory
+
+
+def make_records(boxes: dict, records_per_folder: int=2, **record_fields) -> list:
+    """
+    Get record dictionaries for a box inventory
+    :param boxes: dictionary of box_number, list of folder numbers
+    :param records_per_folder: number of records in each folder
+    :param record_fields: values for all records (e.g., start_date='01/2020')
+    """
+    return [
+        {
+            'box_number': box_number,
+            'folder_number': folder_number,
+            'file_title': f'Box {box_number} folder {folder_number} file {i}',
+            'start_date': '01/2019',
+            'end_date': '06/2019',
+            'cutoff_date': '12/2019',
+        } | record_fields
+        for box_number, folder_numbers in boxes.items()
+        for folder_number in folder_numbers
+        for i in range(records_per_folder)
+    ]
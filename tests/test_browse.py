@@ -0,0 +1,86 @@
+import pytest
+import sqlalchemy as sqla
+
+from recordsdb.database import browse, models, SessionMaker
+import import_transferred_records as imp
+from conftest import make_records
+
+
+def _browse_all(browse_function, page_size: int, **filters) -> list:
+    rows = []
+    cursor = None
+    with SessionMaker() as session:
+        while True:
+            page = browse_function(session, cursor=cursor, page_size=page_size, **filters)
+            assert len(page.rows) <= page_size
+            rows.extend(page.rows)
+            cursor = page.next_cursor
+            if not cursor:
+                return rows
+
+
+@pytest.fixture
+def collection_ids(make_box_inventory) -> list:
+    # Boxes out of order in the inventory so ids don't follow box numbers
+    imp.main(box_inventory_path=make_box_inventory('079-2024-0001', make_records({3: [1], 1: [2, 1], 2: [1]})))
+    imp.main(box_inventory_path=make_box_inventory('079-2024-0002', make_records({1: [1]}, records_per_folder=3)))
+    with SessionMaker() as session:
+        return session.scalars(sqla.select(models.Collection.id).order_by(models.Collection.id)).all()
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 3, 100])
+def test_browse_records_returns_every_record_in_order(collection_ids, page_size):
+    rows = _browse_all(browse.browse_records, page_size)
+
+    keys = [(r['collection_id'], r['box_number'], r['folder_number'], r['id']) for r in rows]
+    assert len(keys) == 11
+    assert keys == sorted(keys)
+    assert len({r['id'] for r in rows}) == len(rows)
+    assert [(box, folder) for collection_id, box, folder, _ in keys if collection_id == collection_ids[0]] == \
+        [(1, 1), (1, 1), (1, 2), (1, 2), (2, 1), (2, 1), (3, 1), (3, 1)]
+
+
+def test_browse_folders_returns_every_folder_in_order(collection_ids):
+    rows = _browse_all(browse.browse_folders, 2)
+
+    assert [(r['collection_id'], r['box_number'], r['folder_number']) for r in rows] == [
+        (collection_ids[0], 1, 1),
+        (collection_ids[0], 1, 2),
+        (collection_ids[0], 2, 1),
+        (collection_ids[0], 3, 1),
+        (collection_ids[1], 1, 1)
+    ]
+
+
+def test_browse_filters(collection_ids):
+    rows = _browse_all(browse.browse_records, 2, collection_id=collection_ids[0], min_box_number=2, max_box_number=2)
+    assert {(r['box_number'], r['folder_number']) for r in rows} == {(2, 1)}
+    assert len(rows) == 2
+
+    rows = _browse_all(browse.browse_boxes, 2, collection_id=collection_ids[1])
+    assert [r['box_number'] for r in rows] == [1]
+
+    assert _browse_all(browse.browse_collections, 1, program_area_code=-1) == []
+
+
+def test_browse_records_skips_destroyed_records(collection_ids):
+    from recordsdb.database.destruction import destroy_collections
+    with SessionMaker.begin() as session:
+        destroy_collections(session, [collection_ids[1]], destruction_year=2024)
+
+    rows = _browse_all(browse.browse_records, 100)
+    assert {r['collection_id'] for r in rows} == {collection_ids[0]}
+
+
+def test_invalid_cursor_and_page_size():
+    with SessionMaker() as session:
+        with pytest.raises(ValueError, match='Invalid cursor'):
+            browse.browse_records(session, cursor='not a cursor')
+        with pytest.raises(ValueError, match='page_size'):
+            browse.browse_records(session, page_size=browse.MAX_PAGE_SIZE + 1)
+
+
+def test_box_and_folder_numbers_are_required(collection_ids):
+    # A NULL in the browse key would end paging early, so the database doesn't allow them
+    with pytest.raises(sqla.exc.IntegrityError), SessionMaker.begin() as session:
+        session.execute(sqla.insert(models.RecordTransferBox).values(collection_id=collection_ids[0], box_number=None))
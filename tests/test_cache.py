@@ -0,0 +1,77 @@
+import pytest
+import sqlalchemy as sqla
+
+from recordsdb.database import models, SessionMaker
+from recordsdb.database.cache import QueryCache
+import import_transferred_records as imp
+from conftest import make_records
+
+
+@pytest.fixture
+def cache() -> QueryCache:
+    cache = QueryCache()
+    cache.register(SessionMaker)
+    yield cache
+    sqla.event.remove(SessionMaker, 'before_flush', cache._track_flush)
+    sqla.event.remove(SessionMaker, 'do_orm_execute', cache._track_execute)
+    sqla.event.remove(SessionMaker, 'after_commit', cache._commit)
+    sqla.event.remove(SessionMaker, 'after_rollback', cache._rollback)
+
+
+@pytest.fixture
+def collection_id(make_box_inventory) -> int:
+    imp.main(box_inventory_path=make_box_inventory('079-2024-0001', make_records({1: [1]}), tags='budget, test'))
+    with SessionMaker() as session:
+        return session.scalar(sqla.select(models.Collection.id))
+
+
+def test_repeated_reads_are_cached(cache, collection_id):
+    statement = sqla.select(models.Collection.collection_name).where(models.Collection.id == collection_id)
+    with SessionMaker() as session:
+        first = cache.execute(session, statement)
+        second = cache.execute(session, statement)
+
+    assert first == [{'collection_name': 'Collection 079-2024-0001'}]
+    assert second is first
+    assert cache.stats()['hits'] == 1
+
+
+def test_commit_invalidates_tables_read(cache, collection_id):
+    statement = sqla.select(models.Collection.collection_name).where(models.Collection.id == collection_id)
+    with SessionMaker() as session:
+        cache.execute(session, statement)
+
+    with SessionMaker.begin() as session:
+        session.get(models.Collection, collection_id).collection_name = 'renamed'
+
+    with SessionMaker() as session:
+        assert cache.execute(session, statement) == [{'collection_name': 'renamed'}]
+
+
+@pytest.mark.parametrize('statement', [
+    # The ORM only adds collection_tags and tags to these while compiling
+    sqla.select(models.Collection.collection_name).join(models.Collection.tags),
+    sqla.select(models.Collection.collection_name).where(models.Collection.tags.any(models.Tag.tag_text == 'budget'))
+])
+def test_relationship_joins_are_invalidated(cache, collection_id, statement):
+    with SessionMaker() as session:
+        assert len(cache.execute(session, statement)) > 0
+
+    with SessionMaker.begin() as session:
+        session.execute(sqla.delete(models.CollectionTag))
+
+    with SessionMaker() as session:
+        assert session.execute(statement).all() == []
+        assert cache.execute(session, statement) == []
+
+
+def test_uncommitted_changes_are_not_cached(cache, collection_id):
+    statement = sqla.select(models.Tag.tag_text).order_by(models.Tag.tag_text)
+    with SessionMaker() as session:
+        session.add(models.Tag(tag_text='pending'))
+        session.flush()
+        assert [r['tag_text'] for r in cache.execute(session, statement)] == ['budget', 'pending', 'test']
+        session.rollback()
+
+    with SessionMaker() as session:
+        assert [r['tag_text'] for r in cache.execute(session, statement)] == ['budget', 'test']
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+import sqlalchemy as sqla
+
+from recordsdb.database import create_db, create_db_engine, models
+from conftest import RETENTION_SCHEDULE_CSV
+
+
+@pytest.fixture
+def db_engine() -> sqla.engine.Engine:
+    # A separate database so changes to the lookup tables don't leak into other tests
+    return create_db_engine('sqlite://', RETENTION_SCHEDULE_CSV)
+
+
+def _read_file_codes(db_engine) -> pd.DataFrame:
+    return pd.read_sql(
+        sqla.select(models.NPSFileCode.nps_item, models.NPSFileCode.code, models.NPSFileCode.sort_order)
+            .order_by(models.NPSFileCode.sort_order),
+        db_engine
+    )
+
+
+def test_reseeding_is_a_no_op(db_engine):
+    counts = create_db.seed_database(db_engine, RETENTION_SCHEDULE_CSV)
+
+    assert set(counts) == {'nps_file_codes', 'park_division_codes', 'program_area_codes', 'transfer_location_codes'}
+    assert all(c['inserted'] == 0 and c['updated'] == 0 and c['unchanged'] > 0 for c in counts.values())
+
+
+def test_reordered_schedule_keeps_existing_codes(db_engine, tmp_path):
+    original = _read_file_codes(db_engine)
+    assert original.values.tolist() == [['1.A.1', 1, 1], ['1.B.2', 2, 2], ['2.A', 3, 3]]
+
+    # Reorder the schedule, reword an item, add one, and drop 1.A.1
+    schedule = pd.read_csv(RETENTION_SCHEDULE_CSV)
+    schedule = pd.concat([
+        schedule.iloc[[2, 1]],
+        pd.DataFrame([{
+            'name': 'New item',
+            'nps_item': '3.A',
+            'nps_authority': 'N1-79-08-3',
+            'drs_authority': 'DAA-0048-2013-0003-0001',
+            'retention_description': '1 year'
+        }])
+    ])
+    schedule.loc[schedule.nps_item == '1.B.2', 'name'] = 'Budget and accounting files'
+    schedule_csv = str(tmp_path / 'retention_schedule.csv')
+    schedule.to_csv(schedule_csv, index=False)
+
+    counts = create_db.seed_database(db_engine, schedule_csv)['nps_file_codes']
+
+    assert (counts['inserted'], counts['updated']) == (1, 3)
+    # Codes follow the item, sort_order follows the new schedule, and the dropped item is kept at the end
+    assert _read_file_codes(db_engine).values.tolist() == \
+        [['2.A', 3, 1], ['1.B.2', 2, 2], ['3.A', 4, 3], ['1.A.1', 1, 4]]
+    with db_engine.connect() as conn:
+        assert conn.execute(
+            sqla.select(models.NPSFileCode.name).where(models.NPSFileCode.code == 2)
+        ).scalar() == 'Budget and accounting files'
+
+    # Running the new schedule again changes nothing
+    counts = create_db.seed_database(db_engine, schedule_csv)['nps_file_codes']
+    assert (counts['inserted'], counts['updated']) == (0, 0)
+
+
+def test_failed_seed_changes_nothing(db_engine, tmp_path, monkeypatch):
+    schedule = pd.read_csv(RETENTION_SCHEDULE_CSV)
+    schedule['name'] = schedule.name + ' (revised)'
+    schedule_csv = str(tmp_path / 'retention_schedule.csv')
+    schedule.to_csv(schedule_csv, index=False)
+
+    # nps_file_codes is synced first, so failing on the next table has to roll its changes back
+    sync_lookup_table = create_db.sync_lookup_table
+    def fail_after_file_codes(conn, table_name, incoming):
+        if table_name != 'nps_file_codes':
+            raise RuntimeError('sync failed')
+        return sync_lookup_table(conn, table_name, incoming)
+    monkeypatch.setattr(create_db, 'sync_lookup_table', fail_after_file_codes)
+
+    with pytest.raises(RuntimeError, match='sync failed'):
+        create_db.seed_database(db_engine, schedule_csv)
+
+    with db_engine.connect() as conn:
+        names = conn.execute(sqla.select(models.NPSFileCode.name).order_by(models.NPSFileCode.code)).scalars().all()
+    assert names == ['General administration', 'Budget files', 'Park history']
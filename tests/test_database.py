@@ -0,0 +1,35 @@
+import pytest
+import sqlalchemy as sqla
+
+from recordsdb.database import create_db_engine, engine, models
+from conftest import RETENTION_SCHEDULE_CSV
+
+
+def _count(conn, model) -> int:
+    return conn.execute(sqla.select(sqla.func.count()).select_from(model)).scalar()
+
+
+def test_in_memory_engine_is_seeded():
+    db_engine = create_db_engine('sqlite://', RETENTION_SCHEDULE_CSV)
+    with db_engine.connect() as conn:
+        assert sqla.inspect(conn).has_table(models.Record.__tablename__)
+        assert _count(conn, models.NPSFileCode) == 3
+        assert _count(conn, models.ProgramAreaCode) > 0
+
+
+def test_in_memory_engines_are_separate_databases():
+    db_engine = create_db_engine('sqlite://', RETENTION_SCHEDULE_CSV)
+    with db_engine.begin() as conn:
+        conn.execute(sqla.insert(models.Collection).values(collection_name='only in this engine'))
+
+    # Every connection from the same engine sees the same database...
+    with db_engine.connect() as conn:
+        assert _count(conn, models.Collection) == 1
+    # ...but other engines don't
+    with engine.connect() as conn:
+        assert _count(conn, models.Collection) == 0
+
+
+def test_foreign_keys_are_enforced():
+    with pytest.raises(sqla.exc.IntegrityError), engine.begin() as conn:
+        conn.execute(sqla.insert(models.RecordTransferBox).values(collection_id=-1, box_number=1))
@@ -0,0 +1,74 @@
+import os
+import sys
+import subprocess
+import pandas as pd
+import pytest
+
+from recordsdb.file_codes import FileCodeIndex, normalize_nps_item
+from conftest import REPO_DIR
+
+
+@pytest.fixture
+def file_code_index() -> FileCodeIndex:
+    return FileCodeIndex(pd.DataFrame({
+        'nps_item':         ['1.A.1', '1.A.2', '1.B', '1.B.2.3', '2.A'],
+        'code':             [1, 2, 3, 4, 5],
+        'retention_years':  [3, 7, None, 10, None]
+    }))
+
+
+@pytest.mark.parametrize('nps_item', ['1.A.1', '1.a.01', 'NPS Item 1.A.1', ' item 1.A.1. ', '1 A 1'])
+def test_normalize_nps_item(nps_item):
+    assert normalize_nps_item(nps_item) == ('1', 'A', '1')
+
+
+def test_exact_match(file_code_index):
+    file_code_match = file_code_index.resolve('1.a.01')
+    assert file_code_match == ('1.A.1', 1, 3, 'exact')
+    assert file_code_index.get('1.B').retention_years is None
+    assert '1.A.2' in file_code_index
+    assert '1.A' not in file_code_index
+
+
+def test_parent_match(file_code_index):
+    # 1.B.7 isn't a file code, so the closest ancestor that is one is 1.B
+    file_code_match = file_code_index.resolve('1.B.7')
+    assert (file_code_match.nps_item, file_code_match.code, file_code_match.match_type) == ('1.B', 3, 'parent')
+    assert file_code_index.parent('1.B.2.3').nps_item == '1.B'
+    assert file_code_index.parent('1.A.1') is None
+
+
+def test_child_match(file_code_index):
+    # 1.B.2 isn't a file code, but 1.B.2.3 is the only file code under it
+    file_code_match = file_code_index.resolve('1.B.2')
+    assert (file_code_match.nps_item, file_code_match.code, file_code_match.match_type) == ('1.B.2.3', 4, 'child')
+    assert [m.nps_item for m in file_code_index.children('1.A')] == ['1.A.1', '1.A.2']
+
+
+def test_ambiguous_match(file_code_index):
+    with pytest.raises(ValueError, match='ambiguous. It could be any of 1.A.1, 1.A.2'):
+        file_code_index.resolve('1.A')
+
+
+@pytest.mark.parametrize('nps_item', ['3.A', '', 'NPS Item'])
+def test_not_found(file_code_index, nps_item):
+    with pytest.raises(ValueError, match='not in file codes'):
+        file_code_index.resolve(nps_item)
+    assert file_code_index.get(nps_item) is None
+
+
+def test_import_without_config(tmp_path):
+    # Scripts that only read spreadsheets shouldn't need a config file or a database
+    environment = os.environ | {'RECORDSDB_CONFIG': str(tmp_path / 'missing.json')}
+    result = subprocess.run(
+        [
+            sys.executable,
+            '-c',
+            'import sys, recordsdb.file_codes; sys.exit("recordsdb.database" in sys.modules)'
+        ],
+        cwd=REPO_DIR,
+        env=environment,
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, result.stderr
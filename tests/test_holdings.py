@@ -0,0 +1,63 @@
+import pandas as pd
+import sqlalchemy as sqla
+
+from recordsdb.database import engine, holdings, models, SessionMaker
+from recordsdb.database.destruction import destroy_collections
+import import_transferred_records as imp
+from conftest import make_records
+
+
+def _import_collections(make_box_inventory) -> list:
+    imp.main(box_inventory_path=make_box_inventory('079-2024-0001', make_records({1: [1, 2]})))
+    imp.main(box_inventory_path=make_box_inventory('079-2024-0002', make_records({1: [1]}, records_per_folder=3)))
+    with engine.begin() as conn:
+        conn.execute(
+            sqla.update(models.Collection)
+                .where(models.Collection.arcis_transfer_number == '079-2024-0001')
+                .values(volume_cu_ft=2, end_date=pd.Timestamp('2019-06-30').date())
+        )
+        conn.execute(
+            sqla.update(models.Collection)
+                .where(models.Collection.arcis_transfer_number == '079-2024-0002')
+                .values(volume_cu_ft=1, end_date=pd.Timestamp('2020-06-30').date())
+        )
+        return conn.execute(sqla.select(models.Collection.id).order_by(models.Collection.id)).scalars().all()
+
+
+def test_holdings_summary_on_sqlite(make_box_inventory):
+    _import_collections(make_box_inventory)
+
+    with engine.connect() as conn:
+        summary = holdings.get_holdings_summary(conn, by=['year'])
+    assert summary.to_dict('records') == [
+        {'year': 2019, 'collection_count': 1, 'volume_cu_ft': 2, 'record_count': 4},
+        {'year': 2020, 'collection_count': 1, 'volume_cu_ft': 1, 'record_count': 3}
+    ]
+
+    with SessionMaker() as session:
+        summary = holdings.get_holdings_summary(session, by=['park_division_code'], year=[2020])
+    assert summary.to_dict('records') == [
+        {'park_division_code': 1, 'collection_count': 1, 'volume_cu_ft': 1, 'record_count': 3}
+    ]
+
+
+def test_destroyed_collections_are_not_holdings(make_box_inventory):
+    collection_ids = _import_collections(make_box_inventory)
+    with SessionMaker.begin() as session:
+        assert destroy_collections(session, [collection_ids[0]], destruction_year=2024) == 4
+
+    with engine.connect() as conn:
+        summary = holdings.get_holdings_summary(conn, by=[])
+    assert summary.to_dict('records') == [{'collection_count': 1, 'volume_cu_ft': 1, 'record_count': 3}]
+
+
+def test_refresh_holdings_summary_on_sqlite(make_box_inventory):
+    _import_collections(make_box_inventory)
+
+    with engine.begin() as conn:
+        holdings.refresh_holdings_summary(conn)
+        rows = conn.execute(
+            sqla.select(models.HoldingsSummary.year, models.HoldingsSummary.record_count)
+                .order_by(models.HoldingsSummary.year)
+        ).all()
+    assert [tuple(row) for row in rows] == [(2019, 4), (2020, 3)]
@@ -0,0 +1,143 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+import sqlalchemy as sqla
+
+from recordsdb.database import engine, holdings, models
+import import_transferred_records as imp
+from conftest import make_records
+
+
+def _validate(**columns) -> pd.DataFrame:
+    data = pd.DataFrame({
+        'box_number': [1],
+        'folder_number': [1],
+        'file_title': ['title'],
+        'start_date': ['01/2020'],
+        'end_date': ['01/2020'],
+        'cutoff_date': [None]
+    } | columns)
+    _, errors = imp.validate_records_data(data)
+    return errors
+
+
+def test_validate_accepts_valid_rows():
+    assert _validate().empty
+
+
+def test_validate_compares_dates_by_month():
+    # A full start date later in the same month as an mm/yyyy end date is fine
+    assert _validate(start_date=[datetime(2020, 1, 5)], end_date=['01/2020'], cutoff_date=['01/2020']).empty
+
+    errors = _validate(start_date=['02/2020'], end_date=['01/2020'], cutoff_date=['12/2019'])
+    assert errors[['field', 'message']].values.tolist() == [
+        ['end_date', 'must not be after the cut-off date'],
+        ['start_date', 'must not be after the end date']
+    ]
+
+
+def test_validate_truncates_long_values():
+    errors = _validate(file_title=['x' * 300])
+    assert errors.message.tolist() == ['must be 255 characters or less']
+    assert len(errors.value[0]) == imp.MAX_ERROR_VALUE_LENGTH
+    assert errors.value[0].endswith('...')
+
+
+def test_validate_box_and_folder_numbers():
+    data = pd.DataFrame({
+        'box_number': [None, 'x', 2.5, 3],
+        'folder_number': [1, 1, 1, None],
+        'file_title': ['a', 'b', 'c', 'd'],
+        'start_date': ['01/2020'] * 4,
+        'end_date': ['01/2020'] * 4
+    })
+    data, errors = imp.validate_records_data(data)
+
+    assert errors[['row', 'field', 'message']].values.tolist() == [
+        [0, 'box_number', 'value is required'],
+        [1, 'box_number', 'must be a positive whole number'],
+        [2, 'box_number', 'must be a positive whole number']
+    ]
+    # Blank folder numbers default to 1
+    assert data.folder_number[3] == 1
+
+
+def test_read_box_inventory_rejects_inexact_file_codes(make_box_inventory):
+    records = make_records({1: [1]})
+
+    # Variant spellings of a file code are fine
+    path = make_box_inventory('079-2024-0001', records, nps_file_code='1.b.02')
+    with engine.connect() as conn:
+        collection_fields, data = imp.read_box_inventory(path, conn)
+    file_code = pd.read_sql("SELECT code FROM nps_file_codes WHERE nps_item = '1.B.2'", engine).code[0]
+    assert collection_fields['nps_file_code'] == file_code
+    assert len(data) == 2
+
+    # A typo must not silently become the parent file code (with its retention period)
+    path = make_box_inventory('079-2024-0002', records, nps_file_code='NPS Item 1.B.2.7')
+    with engine.connect() as conn, pytest.raises(ValueError, match='closest file code is 1.B.2'):
+        imp.read_box_inventory(path, conn)
+
+
+def test_main_imports_box_inventory_once(make_box_inventory):
+    path = make_box_inventory('079-2024-0001', make_records({2: [1, 2], 1: [1]}))
+
+    assert imp.main(box_inventory_path=path) == imp.IMPORT_IMPORTED
+    assert imp.main(box_inventory_path=path) == imp.IMPORT_ALREADY_IMPORTED
+
+    with engine.connect() as conn:
+        collection = conn.execute(sqla.select(models.Collection)).one()
+        assert collection.arcis_transfer_number == '079-2024-0001'
+        assert collection.prepared_date.isoformat() == '2024-05-01'
+        tags = conn.execute(sqla.select(models.Tag.tag_text).order_by(models.Tag.tag_text)).scalars().all()
+        assert tags == ['budget', 'test']
+
+        # Folders and records carry their box and folder numbers for browsing
+        records = pd.read_sql(
+            sqla.select(
+                    models.Record.collection_id,
+                    models.Record.box_number,
+                    models.Record.folder_number,
+                    models.RecordTransferFolder.box_number.label('folder_box_number'),
+                    models.RecordTransferFolder.folder_number.label('folder_folder_number')
+                )
+                .join(models.RecordTransferFolder, models.RecordTransferFolder.id == models.Record.folder_id),
+            conn
+        )
+    assert len(records) == 6
+    assert (records.collection_id == collection.id).all()
+    assert (records.box_number == records.folder_box_number).all()
+    assert (records.folder_number == records.folder_folder_number).all()
+
+
+@pytest.mark.parametrize('passes_locked_check', [False, True])
+def test_main_loses_race_without_writing(make_box_inventory, monkeypatch, passes_locked_check):
+    # Another worker commits the same transfer after this one's first check, and (if passes_locked_check) after the
+    #   check it makes once it holds the transfer lock too, so only ON CONFLICT stops the second insert
+    path = make_box_inventory('079-2024-0001', make_records({1: [1, 2]}))
+    assert imp.main(box_inventory_path=path) == imp.IMPORT_IMPORTED
+    with engine.connect() as conn:
+        summary = holdings.get_holdings_summary(conn)
+
+    monkeypatch.setattr(imp, 'validate_transfer_number', lambda transfer_number: None)
+    if passes_locked_check:
+        monkeypatch.setattr(imp, 'get_collection_id', lambda session, transfer_number: None)
+    assert imp.main(box_inventory_path=path) == imp.IMPORT_ALREADY_IMPORTED
+
+    with engine.connect() as conn:
+        for model in (models.Collection, models.RecordTransferBox, models.RecordTransferFolder, models.Record):
+            n_rows = conn.execute(sqla.select(sqla.func.count()).select_from(model)).scalar()
+            assert n_rows == {models.RecordTransferFolder: 2, models.Record: 4}.get(model, 1)
+        pd.testing.assert_frame_equal(holdings.get_holdings_summary(conn), summary)
+
+
+def test_main_rejects_invalid_inventory_without_writing(make_box_inventory):
+    records = make_records({1: [1]})
+    records[0]['end_date'] = '13/2019'
+    path = make_box_inventory('079-2024-0001', records)
+
+    with pytest.raises(ValueError, match='1 problem'):
+        imp.main(box_inventory_path=path)
+
+    with engine.connect() as conn:
+        assert conn.execute(sqla.select(sqla.func.count()).select_from(models.Collection)).scalar() == 0
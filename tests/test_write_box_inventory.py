@@ -0,0 +1,27 @@
+import pandas as pd
+import sqlalchemy as sqla
+
+from recordsdb.database import engine, models
+import import_transferred_records as imp
+import write_box_inventory
+from conftest import make_records
+
+
+def test_box_inventory_round_trip(make_box_inventory, box_inventory_template, tmp_path):
+    path = make_box_inventory('079-2024-0001', make_records({1: [1, 2]}, description='notes'))
+    imp.main(box_inventory_path=path)
+
+    with engine.connect() as conn:
+        collection_id = conn.execute(sqla.select(models.Collection.id)).scalar()
+        inventory_data = write_box_inventory.query_inventory_data(conn, [collection_id])
+    collection_fields, data = inventory_data[collection_id]
+    output_path = write_box_inventory.write_box_inventory(
+        box_inventory_template, str(tmp_path / 'round_trip.xlsx'), collection_fields, data
+    )
+
+    with engine.connect() as conn:
+        original_fields, original_data = imp.read_box_inventory(path, conn)
+        written_fields, written_data = imp.read_box_inventory(output_path, conn)
+    assert {k: v for k, v in written_fields.items() if k != 'box_inventory_path'} == \
+        {k: v for k, v in original_fields.items() if k != 'box_inventory_path'}
+    pd.testing.assert_frame_equal(written_data, original_data, check_dtype=False)